@@ -0,0 +1,153 @@
+"""
+Content-addressed on-disk cache for generated assets.
+
+Each entry is a folder named by the hash of everything that determines the asset
+(prompt, seed, checkpoint hash and sampler settings) and holds one or more files,
+such as an image, a latent or a mesh. Entries are evicted least recently used
+first once the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+from typing import Callable
+
+from filelock import FileLock
+
+
+@lru_cache()
+def default_cache_dir() -> str:
+    return os.path.join(os.path.abspath(os.getcwd()), "asset_cache")
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(chunk_size)
+            if not len(data):
+                break
+            sha256_hash.update(data)
+    return sha256_hash.hexdigest()
+
+
+class AssetCache:
+    """A size bounded, least recently used cache of generated asset files
+    """
+
+    def __init__(self, root: str | None = None, max_bytes: int = 20 * 1024**3):
+        self.root = root if root is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = FileLock(os.path.join(self.root, ".lock"))
+
+    @staticmethod
+    def key(**fields) -> str:
+        """Create the key for an asset from everything that determines its contents
+
+        Args:
+            **fields: JSON serializable values such as the prompt, seed, checkpoint hash and sampler settings
+
+        Returns:
+            str: The hex digest identifying the asset
+        """
+        blob = json.dumps(fields, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def checkpoint_hash(self, path: str) -> str:
+        """Get the sha256 of a checkpoint file
+
+        The hash is remembered per (path, size, mtime) so multi gigabyte checkpoints are only read once
+
+        Args:
+            path (str): The checkpoint file
+
+        Returns:
+            str: The hex digest of the file
+        """
+        stat = os.stat(path)
+        memo_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        memo_path = os.path.join(self.root, "checkpoints.json")
+        with self._lock:
+            memo = {}
+            if os.path.exists(memo_path):
+                with open(memo_path, "r") as f:
+                    memo = json.load(f)
+            if memo_key not in memo:
+                memo[memo_key] = hash_file(path)
+                with open(memo_path, "w") as f:
+                    json.dump(memo, f, indent=1)
+            return memo[memo_key]
+
+    def entry_path(self, key: str, name: str) -> str:
+        return os.path.join(self.root, key[:2], key, name)
+
+    def get(self, key: str, name: str) -> str | None:
+        """Look up a file of a cached asset
+
+        Args:
+            key (str): The asset key from [AssetCache.key]
+            name (str): The file name within the entry, e.g. 'image.png'
+
+        Returns:
+            str | None: The path of the cached file, or None on a miss
+        """
+        path = self.entry_path(key, name)
+        if not os.path.exists(path):
+            return None
+        # Mark the entry as recently used
+        os.utime(os.path.dirname(path))
+        return path
+
+    def put(self, key: str, name: str, write: Callable[[str], None]) -> str:
+        """Store a file for an asset
+
+        Args:
+            key (str): The asset key from [AssetCache.key]
+            name (str): The file name within the entry, e.g. 'image.png'
+            write (Callable[[str], None]): Writes the file to the path it is given
+
+        Returns:
+            str: The path of the cached file
+        """
+        path = self.entry_path(key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        os.utime(os.path.dirname(path))
+        self.evict()
+        return path
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in [max_bytes]
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, _, size in entries)
+            for _, entry, size in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def _entries(self) -> list[tuple[float, str, int]]:
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry = os.path.join(prefix_dir, key)
+                try:
+                    size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+                    entries.append((os.stat(entry).st_mtime, entry, size))
+                except FileNotFoundError:
+                    continue
+        return entries
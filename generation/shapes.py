@@ -0,0 +1,220 @@
+"""
+Shap-E text to mesh generation with the models kept resident and results cached.
+"""
+
+import numpy as np
+import torch
+
+from shap_e.diffusion.gaussian_diffusion import diffusion_from_config
+from shap_e.diffusion.sample import sample_text_latents
+from shap_e.models.download import CONFIG_PATHS, MODEL_PATHS, URL_HASHES, load_config, load_model
+from shap_e.rendering.mesh import TriMesh
+from shap_e.util.notebooks import decode_latent_meshes
+
+from generation.cache import AssetCache
+from pipeline.tracing import span
+
+
+class TextToShape:
+    """The Shap-E transmitter, text model and diffusion config, loaded on first use.
+    Generates a mesh for each prompt, reusing cached latents and meshes when a cache is given.
+    """
+
+    def __init__(
+        self,
+        device: torch.device | None = None,
+        cache: AssetCache | None = None,
+        model_name: str = "text300M",
+        guidance_scale: float = 20.0,
+        karras_steps: int = 64,
+        sigma_min: float = 1e-3,
+        sigma_max: float = 160,
+        s_churn: float = 0,
+        use_fp16: bool = True,
+        seed: int = 0,
+        grid_size: int = 128,
+        refine_levels: int = 3,
+        refine_band: float = 1.5,
+        max_faces: int | None = 30000,
+    ):
+        if device is None:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = device
+        self.cache = cache
+        self.model_name = model_name
+        self.settings = dict(
+            guidance_scale=guidance_scale,
+            karras_steps=karras_steps,
+            sigma_min=sigma_min,
+            sigma_max=sigma_max,
+            s_churn=s_churn,
+            use_fp16=use_fp16,
+        )
+        self.seed = seed
+        self.grid_size = grid_size
+        self.refine_levels = refine_levels
+        self.refine_band = refine_band
+        self.max_faces = max_faces
+
+        self.xm = None
+        self.model = None
+        self.diffusion = None
+
+    def load(self):
+        """Load the models if they are not loaded yet
+        """
+        if self.model is not None:
+            return
+        with span("shap_e load", model=self.model_name):
+            self.xm = load_model("transmitter", device=self.device)
+            self.model = load_model(self.model_name, device=self.device)
+            self.diffusion = diffusion_from_config(load_config("diffusion"))
+
+    def cache_key(self, text: str) -> str:
+        """Get the asset cache key of the latent for [text]
+        """
+        return AssetCache.key(
+            kind="shap_e",
+            prompt=text,
+            seed=self.seed,
+            model=URL_HASHES[MODEL_PATHS[self.model_name]],
+            diffusion=URL_HASHES[CONFIG_PATHS["diffusion"]],
+            **self.settings,
+        )
+
+    def prompt_seed(self, text: str) -> int:
+        """Get the seed of the noise for [text], derived from its cache key
+        """
+        return int(self.cache_key(text)[:15], 16)
+
+    def sample_latents(self, texts: list[str]) -> dict[str, torch.Tensor]:
+        """Get a latent for every prompt, only sampling the prompts that are not cached
+
+        Every prompt's starting noise and churn noise come from its own seed ([prompt_seed]), so a latent only
+        depends on its cache key and not on which other prompts are sampled with it
+
+        Args:
+            texts (list[str]): The prompts
+
+        Returns:
+            dict[str, torch.Tensor]: The latents keyed by prompt
+        """
+        latents = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            path = self.cache.get(self.cache_key(text), "latent.npy") if self.cache is not None else None
+            if path is not None:
+                latents[text] = torch.from_numpy(np.load(path)).to(self.device)
+            else:
+                missing.append(text)
+        if not missing:
+            return latents
+
+        self.load()
+        sampled = sample_text_latents(
+            texts=missing,
+            model=self.model,
+            diffusion=self.diffusion,
+            clip_denoised=True,
+            use_karras=True,
+            progress=True,
+            seeds=[self.prompt_seed(text) for text in missing],
+            **self.settings,
+        )
+        for text, latent in sampled.items():
+            if self.cache is not None:
+                array = latent.detach().float().cpu().numpy()
+                self.cache.put(self.cache_key(text), "latent.npy", lambda path: np.save(path, array))
+            latents[text] = latent
+        return latents
+
+    def generate_meshes(self, texts: list[str]) -> dict[str, TriMesh]:
+        """Get a mesh for every prompt
+
+        Cached meshes are returned as is, cached latents are only decoded, and the remaining prompts are
+        sampled together before being decoded
+
+        Args:
+            texts (list[str]): The prompts
+
+        Returns:
+            dict[str, TriMesh]: The meshes keyed by prompt
+        """
+        meshes = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            mesh = self.cached_mesh(text)
+            if mesh is not None:
+                meshes[text] = mesh
+            else:
+                missing.append(text)
+        if not missing:
+            return meshes
+
+        meshes.update(self.decode_meshes(self.sample_latents(missing)))
+        return meshes
+
+    def has_mesh(self, text: str) -> bool:
+        return self.cache is not None and self.cache.get(self.cache_key(text), self._mesh_name()) is not None
+
+    def cached_mesh(self, text: str) -> TriMesh | None:
+        """Load the cached mesh for [text] at the current grid size, if there is one
+        """
+        if self.cache is None:
+            return None
+        path = self.cache.get(self.cache_key(text), self._mesh_name())
+        return TriMesh.load(path) if path is not None else None
+
+    def decode_mesh(self, text: str, latent: torch.Tensor) -> TriMesh:
+        """Decode the latent sampled for [text] into a mesh, storing it in the cache
+
+        Args:
+            text (str): The prompt the latent was sampled for
+            latent (torch.Tensor): The latent
+
+        Returns:
+            TriMesh: The decoded mesh
+        """
+        return self.decode_meshes({text: latent})[text]
+
+    def decode_meshes(self, latents: dict[str, torch.Tensor]) -> dict[str, TriMesh]:
+        """Decode the latents sampled for several prompts into meshes, storing them in the cache
+
+        The latents are decoded together, in as few batched SDF grid queries as fit in memory. The SDF is
+        first queried on a grid 2**[refine_levels] times coarser than [grid_size] and only refined within
+        [refine_band] block diagonals of the surface. Each mesh is cleaned up (welded, degenerate faces
+        removed) and decimated to [max_faces] faces, since rigging, FBX export and rendering all scale with its
+        size
+
+        Args:
+            latents (dict[str, torch.Tensor]): The latents keyed by the prompt they were sampled for
+
+        Returns:
+            dict[str, TriMesh]: The decoded meshes keyed by prompt
+        """
+        if not latents:
+            return {}
+        self.load()
+        texts = list(latents)
+        with span("shap_e decode meshes", prompts=len(texts), grid_size=self.grid_size):
+            raw_meshes = decode_latent_meshes(
+                self.xm,
+                torch.stack([latents[text].to(self.device) for text in texts]),
+                grid_size=self.grid_size,
+                refine_levels=self.refine_levels,
+                refine_band=self.refine_band,
+            )
+        meshes = {}
+        for text, raw_mesh in zip(texts, raw_meshes):
+            mesh = raw_mesh.tri_mesh()
+            with span("simplify mesh", faces=len(mesh.faces), max_faces=self.max_faces):
+                mesh = mesh.simplify(self.max_faces)
+            if self.cache is not None:
+                self.cache.put(self.cache_key(text), self._mesh_name(), mesh.save)
+            meshes[text] = mesh
+        return meshes
+
+    def _mesh_name(self) -> str:
+        # Latents can be decoded at several resolutions, refinement settings and face budgets, so each one is
+        # stored separately
+        return f"mesh-{self.grid_size}-{self.refine_levels}-{self.refine_band}-{self.max_faces or 'full'}.npz"
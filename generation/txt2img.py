@@ -0,0 +1,329 @@
+"""
+In-process Stable Diffusion text to image engine.
+
+Adapted from scripts/txt2img.py so that the checkpoint, the CLIP text encoder,
+the safety checker and the watermark encoder are loaded once per process
+instead of once per prompt.
+"""
+
+import os
+from contextlib import nullcontext
+from functools import lru_cache
+
+import cv2
+import numpy as np
+import torch
+from imwatermark import WatermarkEncoder
+from omegaconf import OmegaConf
+from PIL import Image
+from pytorch_lightning import seed_everything
+from torch import autocast
+
+from ldm.util import instantiate_from_config
+from ldm.models.diffusion.ddim import DDIMSampler
+from ldm.models.diffusion.plms import PLMSSampler
+from ldm.models.diffusion.dpm_solver import DPMSolverSampler
+
+from generation.cache import AssetCache
+from pipeline.tracing import span
+
+DEFAULT_CONFIG = "configs/stable-diffusion/v1-inference.yaml"
+DEFAULT_CKPT = "models/ldm/stable-diffusion-v1/model.ckpt"
+SAFETY_MODEL_ID = "CompVis/stable-diffusion-safety-checker"
+WATERMARK = "StableDiffusionV1"
+
+SAMPLERS = {
+    "ddim": DDIMSampler,
+    "plms": PLMSSampler,
+    "dpm_solver": DPMSolverSampler,
+}
+
+
+def load_model_from_config(config, ckpt, device, verbose=False):
+    print(f"Loading model from {ckpt}")
+    pl_sd = torch.load(ckpt, map_location="cpu")
+    if "global_step" in pl_sd:
+        print(f"Global Step: {pl_sd['global_step']}")
+    sd = pl_sd["state_dict"]
+    model = instantiate_from_config(config.model)
+    m, u = model.load_state_dict(sd, strict=False)
+    if len(m) > 0 and verbose:
+        print("missing keys:")
+        print(m)
+    if len(u) > 0 and verbose:
+        print("unexpected keys:")
+        print(u)
+
+    model.to(device)
+    model.eval()
+    return model
+
+
+def numpy_to_pil(images):
+    if images.ndim == 3:
+        images = images[None, ...]
+    images = (images * 255).round().astype("uint8")
+    return [Image.fromarray(image) for image in images]
+
+
+def load_replacement(x):
+    try:
+        hwc = x.shape
+        y = Image.open("assets/rick.jpeg").convert("RGB").resize((hwc[1], hwc[0]))
+        y = (np.array(y) / 255.0).astype(x.dtype)
+        assert y.shape == x.shape
+        return y
+    except Exception:
+        return x
+
+
+def image_filename(prompt: str) -> str:
+    """Get the file name an image generated from [prompt] is saved under
+
+    Args:
+        prompt (str): The prompt the image was generated from
+
+    Returns:
+        str: The file name, e.g. 'beach-ground-texture.png'
+    """
+    return f"{prompt.replace(' ', '-')}.png"
+
+
+class Txt2Img:
+    """A Stable Diffusion model, sampler, safety checker and watermark encoder kept resident in memory.
+    Generates images for any number of prompts without reloading anything.
+    """
+
+    def __init__(
+        self,
+        config: str = DEFAULT_CONFIG,
+        ckpt: str = DEFAULT_CKPT,
+        sampler: str = "plms",
+        precision: str = "autocast",
+        safety_check: bool = True,
+        device: torch.device | None = None,
+        cache: AssetCache | None = None,
+    ):
+        if sampler not in SAMPLERS:
+            raise ValueError(f"Unknown sampler {sampler}. Known samplers are: {SAMPLERS.keys()}.")
+        if device is None:
+            device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+        self.device = device
+        self.config_path = config
+        self.ckpt_path = ckpt
+        self.sampler_name = sampler
+        self.precision = precision
+        self.safety_check = safety_check
+        self.cache = cache
+        self.ckpt_hash = cache.checkpoint_hash(ckpt) if cache is not None else None
+
+        self.model = None
+        self.sampler = None
+        self.safety_feature_extractor = None
+        self.safety_checker = None
+        self.wm_encoder = None
+        if cache is None:
+            self.load()
+
+    def load(self):
+        """Load the model, sampler, safety checker and watermark encoder if they are not loaded yet
+
+        Engines with a cache only load on the first cache miss, so runs that are fully cached never touch the GPU
+        """
+        if self.model is not None:
+            return
+        with span("txt2img load", ckpt=self.ckpt_path):
+            self.model = load_model_from_config(OmegaConf.load(self.config_path), self.ckpt_path, self.device)
+            self.sampler = SAMPLERS[self.sampler_name](self.model)
+
+            if self.safety_check:
+                from diffusers.pipelines.stable_diffusion.safety_checker import StableDiffusionSafetyChecker
+                from transformers import AutoFeatureExtractor
+
+                self.safety_feature_extractor = AutoFeatureExtractor.from_pretrained(SAFETY_MODEL_ID)
+                self.safety_checker = StableDiffusionSafetyChecker.from_pretrained(SAFETY_MODEL_ID)
+
+            self.wm_encoder = WatermarkEncoder()
+            self.wm_encoder.set_watermark("bytes", WATERMARK.encode("utf-8"))
+
+    def generate(
+        self,
+        prompts: list[str],
+        steps: int = 50,
+        scale: float = 7.5,
+        height: int = 512,
+        width: int = 512,
+        channels: int = 4,
+        factor: int = 8,
+        seed: int = 41,
+        batch_size: int = 8,
+    ) -> list[Image.Image]:
+        """Generate one image for each prompt
+
+        Prompts are stacked into a single conditioning batch, so up to [batch_size] prompts share one
+        sampler run and one first stage decode. Every prompt starts from the same seeded noise, which
+        makes an image depend only on its prompt and seed and not on the rest of the batch.
+        When the engine has a cache, cached images are returned without sampling and only the
+        missing prompts are generated.
+
+        Args:
+            prompts (list[str]): The prompts to render
+            steps (int, optional): The number of sampling steps. Defaults to 50.
+            scale (float, optional): The unconditional guidance scale. Defaults to 7.5.
+            height (int, optional): The image height in pixels. Defaults to 512.
+            width (int, optional): The image width in pixels. Defaults to 512.
+            channels (int, optional): The number of latent channels. Defaults to 4.
+            factor (int, optional): The downsampling factor of the first stage. Defaults to 8.
+            seed (int, optional): The seed used for reproducible sampling. Defaults to 41.
+            batch_size (int, optional): The most prompts to sample at once. Defaults to 8.
+
+        Returns:
+            list[Image.Image]: The watermarked images, in the same order as [prompts]
+        """
+        settings = dict(
+            steps=steps, scale=scale, height=height, width=width, channels=channels, factor=factor, seed=seed
+        )
+        if self.cache is None:
+            return self._sample(prompts, batch_size=batch_size, **settings)
+
+        keys = [self.cache_key(prompt, **settings) for prompt in prompts]
+        images = {}
+        for key in keys:
+            path = self.cache.get(key, "image.png")
+            if path is not None:
+                with Image.open(path) as img:
+                    images[key] = img.copy()
+
+        missing = list(dict.fromkeys(p for p, k in zip(prompts, keys) if k not in images))
+        for prompt, image in zip(missing, self._sample(missing, batch_size=batch_size, **settings)):
+            key = self.cache_key(prompt, **settings)
+            self.cache.put(key, "image.png", image.save)
+            images[key] = image
+        return [images[key] for key in keys]
+
+    def cache_key(self, prompt: str, **settings) -> str:
+        """Get the asset cache key of the image for [prompt] with the given sampling settings
+        """
+        return AssetCache.key(
+            kind="txt2img",
+            prompt=prompt,
+            ckpt=self.ckpt_hash,
+            sampler=self.sampler_name,
+            precision=self.precision,
+            **settings,
+        )
+
+    @torch.no_grad()
+    def _sample(
+        self,
+        prompts: list[str],
+        steps: int,
+        scale: float,
+        height: int,
+        width: int,
+        channels: int,
+        factor: int,
+        seed: int,
+        batch_size: int,
+    ) -> list[Image.Image]:
+        if not prompts:
+            return []
+        self.load()
+        seed_everything(seed)
+        shape = [channels, height // factor, width // factor]
+        generator = torch.Generator().manual_seed(seed)
+        start_code = torch.randn([1, *shape], generator=generator).to(self.device)
+        precision_scope = autocast if self.precision == "autocast" else nullcontext
+
+        images = []
+        with precision_scope(self.device.type), self.model.ema_scope():
+            for start in range(0, len(prompts), batch_size):
+                batch = list(prompts[start : start + batch_size])
+                uc = None
+                if scale != 1.0:
+                    uc = self.model.get_learned_conditioning(len(batch) * [""])
+                c = self.model.get_learned_conditioning(batch)
+                with span("txt2img sample", batch_size=len(batch), steps=steps):
+                    samples, _ = self.sampler.sample(
+                        S=steps,
+                        conditioning=c,
+                        batch_size=len(batch),
+                        shape=shape,
+                        verbose=False,
+                        unconditional_guidance_scale=scale,
+                        unconditional_conditioning=uc,
+                        eta=0.0,
+                        x_T=start_code.repeat(len(batch), 1, 1, 1),
+                    )
+                with span("txt2img decode", batch_size=len(batch)):
+                    x_samples = self.model.decode_first_stage(samples)
+                    images.extend(self._to_images(x_samples))
+        return images
+
+    def save(self, images: list[Image.Image], prompts: list[str], outdir: str) -> list[str]:
+        """Save generated images using the same file names as scripts/txt2img.py
+
+        Args:
+            images (list[Image.Image]): The generated images
+            prompts (list[str]): The prompts the images were generated from
+            outdir (str): The folder to save the images into
+
+        Returns:
+            list[str]: The paths of the saved images
+        """
+        os.makedirs(outdir, exist_ok=True)
+        paths = []
+        for image, prompt in zip(images, prompts):
+            path = os.path.join(outdir, image_filename(prompt))
+            image.save(path)
+            paths.append(path)
+        return paths
+
+    def _to_images(self, x_samples: torch.Tensor) -> list[Image.Image]:
+        x_samples = torch.clamp((x_samples + 1.0) / 2.0, min=0.0, max=1.0)
+        x_samples = x_samples.cpu().permute(0, 2, 3, 1).numpy()
+        x_samples = self._check_safety(x_samples)
+
+        images = []
+        for x_sample in x_samples:
+            img = Image.fromarray((255.0 * x_sample).astype(np.uint8))
+            images.append(self._put_watermark(img))
+        return images
+
+    def _check_safety(self, x_image: np.ndarray) -> np.ndarray:
+        if self.safety_checker is None:
+            return x_image
+        safety_checker_input = self.safety_feature_extractor(numpy_to_pil(x_image), return_tensors="pt")
+        x_checked_image, has_nsfw_concept = self.safety_checker(
+            images=x_image, clip_input=safety_checker_input.pixel_values
+        )
+        for i in range(len(has_nsfw_concept)):
+            if has_nsfw_concept[i]:
+                x_checked_image[i] = load_replacement(x_checked_image[i])
+        return x_checked_image
+
+    def _put_watermark(self, img: Image.Image) -> Image.Image:
+        img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+        img = self.wm_encoder.encode(img, "dwtDct")
+        return Image.fromarray(img[:, :, ::-1])
+
+
+@lru_cache()
+def load_txt2img(
+    config: str = DEFAULT_CONFIG,
+    ckpt: str = DEFAULT_CKPT,
+    sampler: str = "plms",
+    cache: AssetCache | None = None,
+) -> Txt2Img:
+    """Get the process wide txt2img engine, loading it on first use
+
+    Args:
+        config (str, optional): The model config. Defaults to DEFAULT_CONFIG.
+        ckpt (str, optional): The model checkpoint. Defaults to DEFAULT_CKPT.
+        sampler (str, optional): One of 'ddim', 'plms' or 'dpm_solver'. Defaults to 'plms'.
+        cache (AssetCache | None, optional): Where to look up and store generated images. Defaults to None.
+
+    Returns:
+        Txt2Img: The loaded engine
+    """
+    return Txt2Img(config=config, ckpt=ckpt, sampler=sampler, cache=cache)
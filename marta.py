@@ -1,131 +1,305 @@
 import spacy
 import os
-import torch
+import sys
+import json
+import re
+import shutil
+import argparse
+from functools import partial
 from nlp.generic_scene_dictionary import generic_settings
 from nlp.generic_dictionary import generic
-from shap_e.diffusion.sample import sample_latents
-from shap_e.diffusion.gaussian_diffusion import diffusion_from_config
-from shap_e.models.download import load_model, load_config
-from shap_e.util.notebooks import decode_latent_mesh
-from rigging.master_rigger import rig
-from rendering.render_runner import render
-from nlp.filter import classify_verb, detect_setting, water
-
-#Initiates spacy nlp model and processes user input 
-nlp = spacy.load("en_core_web_sm")
-para="A man walking on the beach"
-doc = nlp(para)
-
-pnoun=[]            #Proper Nouns
-anouns=[]           #Nouns
-prompt=[]           #Prompts, contains edited text, e.g 'tpose', 'a person'
-saved=[]            #Original names of the prompts, using it as savefile name of prompts as its unedited
-setting=[]          #Story setting
-action=[]           #Verbs
-requiredanim=[]     #Required animations
-location = detect_setting(para) #Detect setting
-animations = os.listdir("animations") #Get animation library
-
-#Adding values to arrays
-for token in doc:
-    if spacy.explain(token.pos_) == "noun":
-        for key in generic:
-            if key == (str(token).lower()):
-                prompt.append(generic[str(token)] + " in a t pose")
-        anouns.append(str(token))
-        saved.append(str(token))
-    elif spacy.explain(token.pos_) == "proper noun":
-        pnoun.append(str(token))
-        saved.append(str(token))      
-    elif spacy.explain(token.pos_) == "verb":
-        action.append(str(token))
-
-#Create prompts for location/setting
-for i in location:
-    for key in generic_settings:
-        if i == key:
-             setting.append(generic_settings[i])
-             
-#Find and append necessary verbs according to the prompt
-classified_verbs = [classify_verb(verb) for verb in action]
-for i in classified_verbs:
-    print(i)
-    for j in animations:
-        if f'{i}.fbx'.lower()==j.lower():
-            requiredanim.append(j)
-               
-#Generate 2D assets
-for i in range(0,len(setting)):
-    os.system(f"python scripts/txt2img.py --prompt \'{str(setting[i])}\'  --skip_grid --plms")
-for i in location:
-   for key in generic_settings:
-       if i == key:
-           os.system(f"python scripts/txt2img.py --prompt \'{str(i)} ground texture\'  --skip_grid --plms") 
-
-#Shap-E 3d model loader
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-xm = load_model('transmitter', device=device)
-model = load_model('text300M', device=device)
-diffusion = diffusion_from_config(load_config('diffusion'))
-
-#Generate 3d assets
-batch_size = 1
-guidance_scale = 20.0
-for i in range(0,len(prompt)):
- 
-    latents = sample_latents(
-        batch_size=batch_size,
-        model=model,
-        diffusion=diffusion,
-        guidance_scale=guidance_scale,
-        model_kwargs=dict(texts=[prompt[i]] * batch_size),
-        progress=True,
-        clip_denoised=True,
-        use_fp16=True,
-        use_karras=True,
-        karras_steps=64,
-        sigma_min=1e-3,
-        sigma_max=160,
-        s_churn=0,
-    )
-
-    render_mode = 'nerf' # you can change this tso 'stf'
-    size = 512 # this is the size of the renders; higher values take longer to render.
-
-    for j, latent in enumerate(latents):
-        t = decode_latent_mesh(xm, latent).tri_mesh()
-        with open(f'3doutputs/{saved[i]}.obj', 'w') as f:
-            t.write_obj(f)
-
-#Load file names for rigging process     
-outputs2d = os.listdir("2doutputs")
-outputs3d = os.listdir("3doutputs")
-watertrue=water(prompt)
-
-#Rig 3d model with animation file
-rig(f"3doutputs/{outputs3d[0]}",f"animations/{requiredanim[0]}",f"rigged/{anouns[0]}{requiredanim[0]}",2)
-
-#Generate scene file
-rigged = os.listdir("rigged")
-f=open("main.scene","w+")
-f.write(f"BACKGROUND_IMAGE 2doutputs/{outputs2d[0]}\n")
-if watertrue:
-    f.write("USE_WATER True\n")
-f.write(f"GROUND_IMAGE 2doutputs/{outputs2d[1]}\n")
-f.write("USE_CYCLES False\n")
-f.write("CHARACTER_SCALE 2\n")
-f.write("\n")
-f.write(f"CHARACTER {anouns[0]}\n")
-f.write(f"anim {requiredanim[0]} rigged/{rigged[0]}\n ")
-f.write("\n")
-f.write("ANIMATION\n")
-f.write(f"{anouns[0]} position 0 -2 0 0\n")
-if requiredanim[0] == "Walk.fbx" or requiredanim[0] =="Run.fbx":
-    f.write(f"{anouns[0]} path {requiredanim[0]} -6 -2 0 6 -2 0 0\n")
-else:
-    f.write(f"{anouns[0]} loop_anim {requiredanim[0]} 0 100\n")
-f.close()
-
-#Render animation using scene file
-render("main.scene","videooutput/animation.mp4")
+from rigging.master_rigger import rig_all
+from rendering.render_runner import render, render_chunked
+from nlp.filter import get_nlp, analyze
+from generation.cache import AssetCache
+from generation.txt2img import image_filename, load_txt2img
+from generation.shapes import TextToShape
+from pipeline.scheduler import Scheduler, GPU, BLENDER
+from pipeline.blender_pool import BlenderPool
+from pipeline import tracing
 
+DEFAULT_PARA = "A man walking on the beach"
+
+class Story:
+    """Everything needed to turn one paragraph into an animation"""
+
+    def __init__(self, story_id, para, doc, outdir):
+        self.id = story_id
+        self.para = para
+        self.outdir = outdir
+        analysis = analyze(doc) #Nouns, verbs, setting and water detection in one pass
+
+        self.pnoun=[]            #Proper Nouns
+        self.anouns=[]           #Nouns
+        self.prompt=[]           #Prompts, contains edited text, e.g 'tpose', 'a person'
+        self.saved=[]            #Original names of the prompts, using it as savefile name of prompts as its unedited
+        self.setting=[]          #Story setting
+        self.requiredanim=[]     #Required animations
+        self.location = analysis.settings #Detect setting
+        self.water = analysis.water
+        animations = os.listdir("animations") #Get animation library
+
+        #Adding values to arrays
+        for token in doc:
+            if spacy.explain(token.pos_) == "noun":
+                for key in generic:
+                    if key == (str(token).lower()):
+                        self.prompt.append(generic[str(token)] + " in a t pose")
+                        self.saved.append(str(token))
+                self.anouns.append(str(token))
+            elif spacy.explain(token.pos_) == "proper noun":
+                self.pnoun.append(str(token))
+
+        #Create prompts for location/setting
+        for i in self.location:
+            for key in generic_settings:
+                if i == key:
+                    self.setting.append(generic_settings[i])
+        self.grounds = [f"{i} ground texture" for i in self.location if i in generic_settings]
+
+        #Find and append necessary verbs according to the prompt
+        for i in analysis.verb_lemmas:
+            for j in animations:
+                if f'{i}.fbx'.lower()==j.lower():
+                    self.requiredanim.append(j)
+
+    def missing(self):
+        """Get what the story is missing to be animated, if anything"""
+        if not self.setting or not self.grounds: return "setting"
+        if not self.prompt: return "character"
+        if not self.requiredanim: return "animation"
+        return None
+
+    def path(self, *parts):
+        return os.path.join(self.outdir, *parts)
+
+class Batch:
+    """Adds the tasks for many stories to one scheduler, generating every shared asset only once"""
+
+    def __init__(self, scheduler, txt2img, shapes, blender=None, render_chunks=1, frames=None, layered=False, quality="final"):
+        self.scheduler = scheduler
+        self.txt2img = txt2img
+        self.shapes = shapes
+        self.blender = blender   #BlenderPool running the rig and render jobs, None to start Blender for every job
+        self.render_chunks = render_chunks   #Blender processes each video is split over
+        self.frames = frames     #PNG / OPEN_EXR to render through a resumable image sequence, None to render straight to video
+        self.layered = layered   #Render the static environment once and only the characters every frame
+        self.quality = quality   #Render quality tier [draft / preview / final]
+        self.images = {}         #2D prompt -> path of the first story's copy
+        self.meshes = {}         #3D prompt -> path of the first story's copy
+        self.rigs = {}           #(3D prompt, animation) -> path of the first story's copy
+        self.videos = {}         #Story id -> path of its animation
+
+    def add_story(self, story):
+        os.makedirs(story.path("2doutputs"), exist_ok=True)
+        os.makedirs(story.path("3doutputs"), exist_ok=True)
+        os.makedirs(story.path("rigged"), exist_ok=True)
+        os.makedirs(story.path("videooutput"), exist_ok=True)
+
+        #2D assets, backgrounds and ground textures
+        backgrounds2d = [self._share(self.images, p, story.path("2doutputs", image_filename(p)), f"{story.id} 2d")
+                         for p in story.setting]
+        grounds2d = [self._share(self.images, p, story.path("2doutputs", image_filename(p)), f"{story.id} 2d")
+                     for p in story.grounds]
+
+        #3D assets and rigs, one per character and required animation
+        rigged = {}
+        for i in range(0,len(story.prompt)):
+            mesh = self._share(self.meshes, story.prompt[i], story.path("3doutputs", f"{story.saved[i]}.npz"),
+                               f"{story.id} 3d")
+            todo = []
+            for anim in dict.fromkeys(story.requiredanim):
+                out = story.path("rigged", f"{story.saved[i]}{anim}")
+                if (story.prompt[i], anim) not in self.rigs:
+                    todo.append((f"animations/{anim}", out))
+                rigged[(story.saved[i], anim)] = self._share(self.rigs, (story.prompt[i], anim), out, f"{story.id} rig")
+            #Skin weights are solved once per character for all of its new animations
+            if todo:
+                anims = [anim for anim, _ in todo]
+                outs = [out for _, out in todo]
+                self.scheduler.add(f"{story.id} rig {story.saved[i]}", partial(rig_all, mesh, anims, outs, 2, pool=self.blender),
+                                   inputs=[mesh, *anims], outputs=outs, resource=BLENDER)
+
+        #Scene file
+        scene = story.path("main.scene")
+        character_rig = rigged[(story.saved[0], story.requiredanim[0])]
+        self.scheduler.add(f"{story.id} scene",
+                           partial(write_scene, scene, story, backgrounds2d[0], grounds2d[0], character_rig, self.layered, self.quality),
+                           inputs=[backgrounds2d[0], grounds2d[0], character_rig], outputs=[scene])
+
+        #Render animation using scene file
+        video = story.path("videooutput", "animation.mp4")
+        if self.render_chunks > 1:
+            render_fn = partial(render_chunked, scene, video, self.render_chunks, pool=self.blender, file_format=self.frames or 'PNG')
+        else:
+            render_fn = partial(render, scene, video, pool=self.blender, file_format=self.frames)
+        self.scheduler.add(f"{story.id} render", render_fn, inputs=[scene], outputs=[video], resource=BLENDER)
+        self.videos[story.id] = video
+        return video
+
+    def run(self):
+        """Run every story, a failure only stops the stories depending on the failed task
+
+        Returns:
+            dict[str, str]: The animation of every finished story keyed by story id
+        """
+        self.scheduler.run(keep_going=True)
+        return {story_id: video for story_id, video in self.videos.items()
+                if f"{story_id} render" in self.scheduler.results}
+
+    def add_generation(self):
+        """Add the GPU tasks, once every story has been added"""
+        prompts2d = list(self.images)
+        paths2d = [self.images[p] for p in prompts2d]
+        self.scheduler.add("txt2img", partial(self._generate_images, prompts2d, paths2d),
+                           outputs=paths2d, resource=GPU)
+
+        #Every character prompt without a cached mesh is denoised in one diffusion loop, then decoded in one batch
+        prompts3d = list(self.meshes)
+        self.scheduler.add("shap_e", lambda: self.shapes.sample_latents([p for p in prompts3d if not self.shapes.has_mesh(p)]),
+                           resource=GPU)
+        self.scheduler.add("shap_e decode", partial(self._decode_meshes, prompts3d), resource=GPU, after=["shap_e"])
+        for p in prompts3d:
+            self.scheduler.add(f"mesh {p}", partial(self._write_mesh, p, self.meshes[p]),
+                               outputs=[self.meshes[p]], after=["shap_e decode"])
+
+    def _share(self, produced, key, path, name):
+        # The first story needing an asset produces it, the others copy it into their own folder
+        if key not in produced:
+            produced[key] = path
+        elif produced[key] != path:
+            self.scheduler.add(f"{name} copy {os.path.basename(path)}", partial(shutil.copyfile, produced[key], path),
+                               inputs=[produced[key]], outputs=[path])
+        return path
+
+    def _generate_images(self, prompts, paths):
+        for image, path in zip(self.txt2img.generate(prompts), paths):
+            image.save(path)
+
+    def _decode_meshes(self, prompts):
+        meshes = self.shapes.decode_meshes(self.scheduler.results["shap_e"])
+        #Meshes that were cached when sampling started are loaded here, a mesh evicted since then is generated again
+        meshes.update(self.shapes.generate_meshes([p for p in prompts if p not in meshes]))
+        return meshes
+
+    def _write_mesh(self, text, path):
+        mesh = self.scheduler.results["shap_e decode"][text]
+        #Saved as .npz so the rigger can load the arrays directly instead of parsing an OBJ
+        with tracing.span("write mesh", path=path):
+            mesh.save(path)
+
+def write_scene(path, story, background, ground, character_rig, layered=False, quality="final"):
+    anouns = story.saved
+    requiredanim = story.requiredanim
+    f=open(path,"w+")
+    f.write(f"BACKGROUND_IMAGE {background}\n")
+    if story.water:
+        f.write("USE_WATER True\n")
+    f.write(f"GROUND_IMAGE {ground}\n")
+    #Layered rendering needs the Cycles shadow catcher to keep the characters' ground shadows
+    f.write(f"USE_CYCLES {layered}\n")
+    if layered:
+        f.write("LAYERED True\n")
+    f.write(f"QUALITY {quality}\n")
+    f.write("CHARACTER_SCALE 2\n")
+    f.write("\n")
+    f.write(f"CHARACTER {anouns[0]}\n")
+    f.write(f"anim {requiredanim[0]} {character_rig}\n ")
+    f.write("\n")
+    f.write("ANIMATION\n")
+    f.write(f"{anouns[0]} position 0 -2 0 0\n")
+    if requiredanim[0] == "Walk.fbx" or requiredanim[0] =="Run.fbx":
+        f.write(f"{anouns[0]} path {requiredanim[0]} -6 -2 0 6 -2 0 0\n")
+    else:
+        f.write(f"{anouns[0]} loop_anim {requiredanim[0]} 0 100\n")
+    f.close()
+
+def story_dirname(story_id):
+    """Make a story id safe to use as a folder name, e.g. '../a b' -> 'a_b'"""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", story_id).strip("._")
+
+def read_stories(source):
+    """Read (id, paragraph) pairs from a JSONL file, a text file with one paragraph per line, or stdin ('-')
+
+    JSONL ids are sanitised with story_dirname, and ids that end up the same are rejected before anything runs
+    """
+    f = sys.stdin if source == "-" else open(source, "r")
+    stories = []
+    for line in f:
+        line = line.strip()
+        if not line: continue
+        default_id = f"story-{len(stories):04d}"
+        if line.startswith("{"):
+            entry = json.loads(line)
+            stories.append((story_dirname(str(entry.get("id", default_id))) or default_id, entry["text"]))
+        else:
+            stories.append((default_id, line))
+    if f is not sys.stdin:
+        f.close()
+    seen = set()
+    for story_id, _ in stories:
+        if story_id in seen:
+            raise Exception(f"Duplicate story id in {source}: {story_id}")
+        seen.add(story_id)
+    return stories
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn paragraphs into 3D animations")
+    parser.add_argument("--text", type=str, default=DEFAULT_PARA, help="the paragraph to animate")
+    parser.add_argument("--batch", type=str, help="JSONL ({\"id\": ..., \"text\": ...}) or text file of paragraphs, '-' for stdin")
+    parser.add_argument("--outdir", type=str, default="stories", help="where each batch story gets its own folder")
+    parser.add_argument("--blender_workers", type=int, default=None, help="Blender processes to run at once")
+    parser.add_argument("--render_chunks", type=int, default=1, help="split each video's frames over this many Blender processes")
+    parser.add_argument("--frames", type=str, choices=["PNG", "OPEN_EXR"], help="render through a resumable image sequence, rerunning only renders missing frames")
+    parser.add_argument("--layered", action="store_true", help="render the static background once and composite the characters over it, uses Cycles")
+    parser.add_argument("--quality", type=str, default="final", choices=["draft", "preview", "final"], help="draft and preview render faster at a lower resolution and sample count")
+    parser.add_argument("--no_worker", action="store_true", help="start a new Blender process for every rig and render job")
+    parser.add_argument("--trace", type=str, help="write per stage timings and memory use to this Chrome trace file")
+    opt = parser.parse_args()
+    if opt.trace:
+        tracing.enable(opt.trace)
+
+    #Models stay loaded for every story in the process
+    with tracing.span("load spacy"):
+        nlp = get_nlp()
+    cache = AssetCache()
+    scheduler = Scheduler(blender_workers=opt.blender_workers)
+    #One long-lived Blender per scheduler thread, so Blender only starts once per worker
+    blender = None if opt.no_worker else BlenderPool(scheduler.blender_workers)
+    batch = Batch(scheduler, load_txt2img(cache=cache), TextToShape(cache=cache), blender, opt.render_chunks, opt.frames, opt.layered, opt.quality)
+
+    if opt.batch:
+        entries = read_stories(opt.batch)
+        outdirs = [os.path.join(opt.outdir, story_id) for story_id, _ in entries]
+    else:
+        #A single story keeps writing into 2doutputs, 3doutputs, rigged and videooutput
+        entries = [("story", opt.text)]
+        outdirs = ["."]
+
+    with tracing.span("nlp", stories=len(entries)):
+        docs = list(nlp.pipe(para for _, para in entries))
+    for (story_id, para), doc, outdir in zip(entries, docs, outdirs):
+        story = Story(story_id, para, doc, outdir)
+        missing = story.missing()
+        if missing:
+            print(f"Skipping {story_id}, no {missing} found in: {para}")
+            continue
+        batch.add_story(story)
+    batch.add_generation()
+    try:
+        videos = batch.run()
+    finally:
+        if blender is not None:
+            blender.close()
+        tracing.save()
+    for video in videos.values():
+        print(f"Saved animation to {video}")
+    failed = [story_id for story_id in batch.videos if story_id not in videos]
+    if failed:
+        for failure in scheduler.failed.values():
+            print(failure)
+        print(f"Failed stories: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,56 @@
 import spacy
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable
 
-def classify_verb(verb):
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(verb)
-    return doc[0].lemma_
+from spacy.tokens import Doc
 
-def detect_setting(text):
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(text)
+MODEL = "en_core_web_sm"
+
+@lru_cache()
+def get_nlp(model=MODEL):
+    # The pipeline takes seconds to load, so it is loaded once and shared by every caller
+    return spacy.load(model)
+
+@dataclass
+class StoryAnalysis:
+    nouns: list = field(default_factory=list)           #Nouns
+    proper_nouns: list = field(default_factory=list)    #Proper nouns
+    verbs: list = field(default_factory=list)           #Verbs as written
+    verb_lemmas: list = field(default_factory=list)     #Verbs in their base form, e.g 'walking' -> 'walk'
+    settings: list = field(default_factory=list)        #Nouns that can describe the setting
+    water: bool = False                                 #Whether the story takes place on water
 
-    location_terms = []
+def analyze(doc: Doc) -> StoryAnalysis:
+    """Extract nouns, verbs, settings and water detection from an already parsed doc in a single pass"""
+    result = StoryAnalysis()
     for token in doc:
-        if token.pos_ == "NOUN" and token.dep_ in ("pobj", "dobj"):
-            location_terms.append(token.text)
+        if token.pos_ == "NOUN":
+            result.nouns.append(token.text)
+            if token.dep_ in ("pobj", "dobj"):
+                result.settings.append(token.text)
+            if token.text.lower() == "water":
+                result.water = True
+        elif token.pos_ == "PROPN":
+            result.proper_nouns.append(token.text)
+        elif token.pos_ == "VERB":
+            result.verbs.append(token.text)
+            result.verb_lemmas.append(token.lemma_)
+    return result
 
-    return location_terms
+def analyze_texts(texts: Iterable[str], batch_size=64) -> list:
+    """Analyze many texts, parsing them together with nlp.pipe"""
+    return [analyze(doc) for doc in get_nlp().pipe(texts, batch_size=batch_size)]
+
+def classify_verb(verb):
+    doc = get_nlp()(verb)
+    return doc[0].lemma_
+
+def detect_setting(text):
+    return analyze(get_nlp()(text)).settings
 
 def water(array):
-    nlp = spacy.load("en_core_web_sm")
     for i in array:
          if i.lower() == "water":
-            return True
\ No newline at end of file
+            return True
+    return False
@@ -0,0 +1,121 @@
+"""
+A pool of long-lived Blender workers (see pipeline/blender_worker.py).
+
+Starting Blender, enabling add-ons and clearing the default scene take seconds,
+which used to be paid for every rig and every render. The pool keeps N Blender
+processes running and hands each job to an idle one, restarting a worker if its
+process dies.
+"""
+
+import json
+import queue
+import subprocess
+import sys
+from typing import Any
+
+from pipeline import tracing
+
+WORKER_SCRIPT = "pipeline/blender_worker.py"
+RESPONSE_PREFIX = "MARTA_WORKER "
+
+
+class BlenderWorker:
+    """One Blender process, running one job at a time
+    """
+
+    def __init__(self, blender: str = "blender"):
+        self.blender = blender
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.blender, "-b", "--python", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self._read_response()
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, command: str, **args):
+        """Run a job in this worker and wait for it to finish
+
+        Args:
+            command (str): The job to run [rig / render]
+            **args: The job's arguments
+
+        Raises:
+            Exception: When the job fails or the worker dies
+        """
+        if not self.alive():
+            self.start()
+        with tracing.sidecar() as env:
+            job = {"command": command, "args": args}
+            if env is not None:
+                job["trace"] = env[tracing.SIDECAR_ENV]
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+            response = self._read_response()
+        if not response["ok"]:
+            raise Exception(f"Blender {command} failed: {response['error']}")
+
+    def close(self):
+        if not self.alive():
+            return
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def _read_response(self) -> dict[str, Any]:
+        # Pass Blender's own output through until the worker answers
+        for line in self.process.stdout:
+            if line.startswith(RESPONSE_PREFIX):
+                return json.loads(line[len(RESPONSE_PREFIX):])
+            sys.stdout.write(line)
+        self.process.wait()
+        raise Exception(f"Blender worker exited with code {self.process.returncode}")
+
+
+class BlenderPool:
+    """Runs Blender jobs on [workers] long-lived Blender processes, started on first use
+    """
+
+    def __init__(self, workers: int = 1, blender: str = "blender"):
+        self.workers = [BlenderWorker(blender) for _ in range(workers)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def run(self, command: str, **args):
+        """Run a job on the next idle worker, waiting for one if they are all busy
+        """
+        worker = self._idle.get()
+        try:
+            with tracing.span(f"blender {command}", **args):
+                worker.run(command, **args)
+        finally:
+            self._idle.put(worker)
+
+    def rig(self, model_file, rig_file, out_file, target_height=1.8):
+        self.run("rig", model_file=model_file, rig_file=rig_file, out_file=out_file, target_height=target_height)
+
+    def rig_all(self, model_file, rig_files, out_files, target_height=1.8):
+        self.run("rig_all", model_file=model_file, rig_files=rig_files, out_files=out_files, target_height=target_height)
+
+    def render(self, scene_file, out_file, file_format=None):
+        self.run("render", scene_file=scene_file, output_file=out_file, file_format=file_format)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,82 @@
+"""
+A long-lived Blender process that runs rig and render jobs.
+
+Started by BlenderPool with `blender -b --python pipeline/blender_worker.py`.
+Each job is one JSON line on stdin, e.g.
+
+    {"command": "rig", "args": {"model_file": ..., "rig_file": ..., "out_file": ..., "target_height": 2}}
+    {"command": "rig_all", "args": {"model_file": ..., "rig_files": [...], "out_files": [...], "target_height": 2}}
+    {"command": "render", "args": {"scene_file": ..., "output_file": ...}, "trace": "/tmp/marta-trace-x.json"}
+    {"command": "render_chunk", "args": {"scene_file": ..., "frames_dir": ..., "chunk": 0, "chunks": 4}}
+    {"command": "encode", "args": {"frames_dir": ..., "output_file": ...}}
+
+and the worker answers with one line starting with RESPONSE_PREFIX followed by
+{"ok": true} or {"ok": false, "error": ...}. Everything else Blender prints is
+left as is so the pool can pass it through. Blender startup and add-on enabling
+happen once, and the scene is cleared between jobs.
+"""
+
+import json
+import os
+import sys
+import traceback
+
+import addon_utils
+import bpy
+
+# Blender does not add the working directory to the path
+WORKING_DIR = os.getcwd()
+sys.path.append(WORKING_DIR)
+sys.path.append(f"{WORKING_DIR}/rendering")
+from pipeline import tracing
+from rendering import master_renderer
+from rigging import blender_rigger
+from renderer import Renderer
+
+RESPONSE_PREFIX = "MARTA_WORKER "
+
+COMMANDS = {
+    "rig": blender_rigger.rig_model,
+    "rig_all": blender_rigger.rig_model_animations,
+    "render": master_renderer.render_scene,
+    "render_chunk": master_renderer.render_chunk,
+    "encode": master_renderer.encode_video,
+}
+
+
+def respond(**response):
+    sys.stdout.write(RESPONSE_PREFIX + json.dumps(response) + "\n")
+    sys.stdout.flush()
+
+
+def run_job(job):
+    if job["command"] not in COMMANDS:
+        raise Exception(f"Unknown worker command: {job['command']}")
+    if job.get("trace"):
+        tracing.enable(job["trace"])
+    try:
+        Renderer.clear_scene()
+        COMMANDS[job["command"]](**job.get("args", {}))
+    finally:
+        tracing.save()
+        tracing.disable()
+
+
+def main():
+    addon_utils.enable("io_import_images_as_planes")
+    respond(ok=True, ready=True)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            run_job(json.loads(line))
+        except Exception as exc:
+            traceback.print_exc()
+            respond(ok=False, error=f"{type(exc).__name__}: {exc}")
+        else:
+            respond(ok=True)
+
+
+if __name__ == "__main__":
+    main()
+    bpy.ops.wm.quit_blender()
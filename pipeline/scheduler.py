@@ -0,0 +1,192 @@
+"""
+A small DAG scheduler for the MARTA pipeline.
+
+Every stage (txt2img, Shap-E, rigging, rendering) is a task that declares the
+files it reads and writes. A task starts as soon as every task producing one of
+its inputs has finished. GPU tasks run one at a time on a dedicated GPU queue,
+while Blender tasks run in a pool of worker threads that each drive their own
+Blender subprocess, so diffusion on the GPU overlaps with rigging and rendering
+on the CPU.
+"""
+
+import os
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from pipeline.tracing import span
+
+GPU = "gpu"
+BLENDER = "blender"
+CPU = "cpu"
+
+
+@dataclass
+class Task:
+    """A unit of work in the pipeline
+
+    Args:
+        name (str): A unique name for the task
+        fn (Callable[[], Any]): The work to do
+        inputs (list[str]): The files the task reads
+        outputs (list[str]): The files the task writes
+        resource (str): Which queue to run on [GPU / BLENDER / CPU]
+        after (list[str]): Names of tasks that must finish first even though no file connects them
+    """
+
+    name: str
+    fn: Callable[[], Any]
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    resource: str = CPU
+    after: list[str] = field(default_factory=list)
+
+
+class TaskFailed(Exception):
+    def __init__(self, task: Task, error: BaseException):
+        super().__init__(f"Task {task.name} failed: {error}")
+        self.task = task
+        self.error = error
+
+
+class Scheduler:
+    """Runs a graph of tasks with GPU work and Blender work overlapping
+    """
+
+    def __init__(self, blender_workers: int | None = None, cpu_workers: int | None = None):
+        self.blender_workers = blender_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.cpu_workers = cpu_workers or 2
+        self.tasks: dict[str, Task] = {}
+        self.results: dict[str, Any] = {}
+        self.failed: dict[str, TaskFailed] = {}
+        self.skipped: set[str] = set()
+        self._producers: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        inputs: list[str] | None = None,
+        outputs: list[str] | None = None,
+        resource: str = CPU,
+        after: list[str] | None = None,
+    ) -> Task:
+        """Add a task to the graph
+
+        Args:
+            name (str): A unique name for the task
+            fn (Callable[[], Any]): The work to do
+            inputs (list[str] | None, optional): The files the task reads. Defaults to None.
+            outputs (list[str] | None, optional): The files the task writes. Defaults to None.
+            resource (str, optional): Which queue to run on [GPU / BLENDER / CPU]. Defaults to CPU.
+            after (list[str] | None, optional): Tasks that must finish first. Defaults to None.
+
+        Returns:
+            Task: The new task
+        """
+        if name in self.tasks:
+            raise Exception(f"Duplicate task: {name}")
+        if resource not in (GPU, BLENDER, CPU):
+            raise Exception(f"Unknown resource: {resource}")
+        task = Task(name, fn, list(inputs or []), list(outputs or []), resource, list(after or []))
+        for output in task.outputs:
+            key = os.path.abspath(output)
+            if key in self._producers:
+                raise Exception(f"{output} is produced by both {self._producers[key]} and {name}")
+            self._producers[key] = name
+        self.tasks[name] = task
+        return task
+
+    def dependencies(self, task: Task) -> set[str]:
+        """Get the names of the tasks that [task] waits for
+        """
+        deps = set(task.after)
+        for path in task.inputs:
+            producer = self._producers.get(os.path.abspath(path))
+            if producer is not None and producer != task.name:
+                deps.add(producer)
+        for dep in deps:
+            if dep not in self.tasks:
+                raise Exception(f"Task {task.name} depends on unknown task {dep}")
+        return deps
+
+    def run(self, keep_going: bool = False) -> dict[str, Any]:
+        """Run every task that has not run yet, respecting dependencies
+
+        Args:
+            keep_going (bool, optional): Whether to keep running the tasks that do not depend on a failed task.
+                The failures are kept in [failed] and the tasks depending on them in [skipped]. Defaults to False.
+
+        Raises:
+            TaskFailed: When a task raises and [keep_going] is False, after the tasks already running have finished
+
+        Returns:
+            dict[str, Any]: The return value of every task keyed by task name
+        """
+        pending = {
+            name: self.dependencies(task)
+            for name, task in self.tasks.items()
+            if name not in self.results and name not in self.failed and name not in self.skipped
+        }
+        self._check_acyclic(pending)
+
+        executors = {
+            GPU: ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu"),
+            BLENDER: ThreadPoolExecutor(max_workers=self.blender_workers, thread_name_prefix="blender"),
+            CPU: ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="cpu"),
+        }
+        running: dict[Future, Task] = {}
+        failure = None
+        try:
+            while pending or running:
+                if keep_going:
+                    self._skip_dependents(pending)
+                if failure is None or keep_going:
+                    for name in [n for n, deps in pending.items() if deps.issubset(self.results)]:
+                        task = self.tasks[name]
+                        del pending[name]
+                        running[executors[task.resource].submit(self._run_task, task)] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        traceback.print_exception(type(error), error, error.__traceback__)
+                        self.failed[task.name] = TaskFailed(task, error)
+                        failure = failure or self.failed[task.name]
+                        continue
+                    with self._lock:
+                        self.results[task.name] = future.result()
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+        if failure is not None and not keep_going:
+            raise failure
+        return self.results
+
+    def _run_task(self, task: Task) -> Any:
+        with span(task.name, resource=task.resource):
+            return task.fn()
+
+    def _skip_dependents(self, pending: dict[str, set[str]]):
+        # Skipping a task can make the tasks waiting for it skippable, so repeat until nothing changes
+        skipped = True
+        while skipped:
+            skipped = [name for name, deps in pending.items() if deps & (self.failed.keys() | self.skipped)]
+            for name in skipped:
+                del pending[name]
+                self.skipped.add(name)
+
+    def _check_acyclic(self, pending: dict[str, set[str]]):
+        remaining = {name: set(deps) for name, deps in pending.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not (deps & remaining.keys())]
+            if not ready:
+                raise Exception(f"Task graph has a cycle between: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
@@ -0,0 +1,230 @@
+"""
+Lightweight per-stage tracing for the MARTA pipeline.
+
+Wrap a stage in `with span("name"):` to record its wall time and the process
+RSS. Spans of GPU tasks (`resource="gpu"`) and the spans nested in them also
+record the CUDA peak memory allocated while they ran. Spans cost nothing until
+tracing is enabled with `enable()`, and `save()` writes every span as a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Blender subprocesses cannot share memory with the parent, so the parent hands
+them a sidecar file through the MARTA_TRACE_SIDECAR environment variable. The
+Blender script calls `enable_from_env()` and `save()`, and the parent merges
+the sidecar into its own trace once the subprocess exits.
+
+This module only depends on the standard library so it can be imported from
+Blender's bundled Python. torch and psutil are used when they are available.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+SIDECAR_ENV = "MARTA_TRACE_SIDECAR"
+GPU_RESOURCE = "gpu"  # pipeline.scheduler.GPU, which imports this module
+
+
+class Tracer:
+    """Collects finished spans as Chrome trace events
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add_events(self, events: list[dict]):
+        with self._lock:
+            self.events.extend(events)
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[dict]:
+        stack = self._stack()
+        # CUDA peak stats are global to the process, so only the spans of GPU tasks use them. The scheduler runs
+        # GPU tasks one at a time on one thread, which makes it the only thread resetting the stats.
+        parent_cuda = bool(stack) and stack[-1]["cuda"]
+        frame = {"cuda": parent_cuda or args.get("resource") == GPU_RESOURCE, "cuda_peak": 0}
+        if frame["cuda"] and not parent_cuda:
+            _cuda_peak_bytes(reset=True)
+        stack.append(frame)
+        rss_start = _rss_bytes()
+        start_ts = time.time()
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+
+            # Reset the stats after every GPU span and fold the child's peak into its parent.
+            cuda_peak = max(frame["cuda_peak"], _cuda_peak_bytes(reset=True)) if frame["cuda"] else 0
+            if stack:
+                stack[-1]["cuda_peak"] = max(stack[-1]["cuda_peak"], cuda_peak)
+
+            args = dict(args)
+            args["wall_s"] = duration
+            args["rss_start_bytes"] = rss_start
+            args["rss_end_bytes"] = _rss_bytes()
+            if cuda_peak:
+                args["cuda_peak_bytes"] = cuda_peak
+            self.add_events(
+                [
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start_ts * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": args,
+                    }
+                ]
+            )
+
+    def save(self, path: str | None = None):
+        """Write the recorded spans as a Chrome trace
+
+        Args:
+            path (str | None, optional): Where to write the trace. Defaults to the tracer's path.
+        """
+        path = path or self.path
+        if path is None:
+            raise Exception("No trace path given")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp_path, path)
+
+    def summary(self) -> dict[str, float]:
+        """Get the total wall time in seconds spent in each span name
+        """
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return totals
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+
+_tracer: Tracer | None = None
+
+
+def enable(path: str | None = None) -> Tracer:
+    """Start recording spans in this process
+
+    Args:
+        path (str | None, optional): The default path for [save]. Defaults to None.
+
+    Returns:
+        Tracer: The active tracer
+    """
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def disable():
+    """Stop recording spans, e.g. once a job's sidecar has been saved
+    """
+    global _tracer
+    _tracer = None
+
+
+def enable_from_env() -> Tracer | None:
+    """Start recording spans if the parent process asked for a sidecar trace
+    """
+    path = os.environ.get(SIDECAR_ENV)
+    return enable(path) if path else None
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def save(path: str | None = None):
+    if _tracer is not None:
+        _tracer.save(path)
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[dict]:
+    """Record the time and memory used by the enclosed block
+
+    Args:
+        name (str): The name of the stage
+        **args: Extra values to store with the span, e.g. the prompt
+
+    Yields:
+        dict: The span's values, more can be added while it runs
+    """
+    if _tracer is None:
+        yield args
+        return
+    with _tracer.span(name, **args) as values:
+        yield values
+
+
+@contextmanager
+def sidecar() -> Iterator[dict | None]:
+    """Collect the spans of a subprocess into this process's trace
+
+    Yields:
+        dict | None: The environment to start the subprocess with, or None when tracing is off
+    """
+    if _tracer is None:
+        yield None
+        return
+    fd, path = tempfile.mkstemp(prefix="marta-trace-", suffix=".json")
+    os.close(fd)
+    os.remove(path)
+    env = dict(os.environ)
+    env[SIDECAR_ENV] = path
+    try:
+        yield env
+    finally:
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    _tracer.add_events(json.load(f)["traceEvents"])
+            except (OSError, ValueError, KeyError) as exc:
+                print(f"Could not read trace sidecar {path}: {exc}")
+            os.remove(path)
+
+
+def _cuda_peak_bytes(reset: bool = False) -> int:
+    # Never import torch here, Blender's Python does not have it
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available() or not torch.cuda.is_initialized():
+        return 0
+    peak = torch.cuda.max_memory_allocated()
+    if reset:
+        torch.cuda.reset_peak_memory_stats()
+    return peak
+
+
+def _rss_bytes() -> int | None:
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
@@ -39,13 +39,20 @@ class AnimatedObject:
         
     def add_fbx_anim(self, anim_name: str, filepath: str):
         """Add an fbx animation to this object
+        
+        Only the first animation imports the character, the others are played on its armature
 
         Args:
             anim_name (str): The name of the animation
             filepath (str): The file containing the animation
         """
-        anim = FbxAnimation(filepath)
-        self.add_animation(anim_name, anim.root)
+        shared = next(iter(self.fbx_anims.values()), None)
+        if shared is None:
+            anim = FbxAnimation(filepath)
+            self.add_animation(anim_name, anim.root)
+        else:
+            anim = FbxAnimation(filepath, shared=shared)
+            self.animations[anim_name] = anim.root
         self.fbx_anims[anim_name] = anim
         
     def animate_path(
@@ -123,9 +130,10 @@ class AnimatedObject:
             name (str): The name of the animation
             frame (int): The frame on which to switch
         """
-        for anim_name in self.animations:
-            anim = self.animations[anim_name]
-            hide = anim_name != name
+        # Animations sharing a character share its object, so each object is only keyed once
+        current = self.animations[name]
+        for anim in dict.fromkeys(self.animations.values()):
+            hide = anim != current
             anim.hide_viewport = hide
             anim.hide_render = hide
             anim.keyframe_insert(data_path="hide_viewport", frame=frame) 
@@ -0,0 +1,37 @@
+import bpy
+import os, sys
+import glob
+
+# Add the scripts folder to the path
+WORKING_DIR = os.getcwd()
+sys.path.append(f'{WORKING_DIR}/rendering')
+
+from fbx_anim import FbxAnimation, BAKE_DIR
+from renderer import Renderer
+
+def bake(filepaths, bake_dir=BAKE_DIR):
+    """Bake the keyframes, length and cycle offset of every animation so rendering can skip deriving them
+
+    Args:
+        filepaths (list[str]): The fbx files to bake
+        bake_dir (str, optional): Where to store the baked archives. Defaults to BAKE_DIR.
+    """
+    for filepath in filepaths:
+        Renderer.clear_scene()
+        print(f"Baking {filepath}")
+        FbxAnimation(filepath, bake_dir)
+
+def main():
+    # blender -b --python rendering/bake_animations.py -- [fbx files or folders, defaults to rigged/]
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    filepaths = []
+    for arg in args or [os.path.join(WORKING_DIR, "rigged")]:
+        if os.path.isdir(arg):
+            filepaths.extend(sorted(glob.glob(os.path.join(arg, "*.fbx"))))
+        else:
+            filepaths.append(arg)
+    bake(filepaths)
+
+if __name__ == "__main__":
+    main()
+    bpy.ops.wm.quit_blender()
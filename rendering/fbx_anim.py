@@ -1,24 +1,66 @@
 import bpy
+import hashlib
+import os
+import numpy as np
 from mathutils import Vector
 
+# Baked animation data, one archive per fbx file keyed by its hash
+BAKE_DIR = os.path.join(os.getcwd(), "anim_cache")
+BAKE_VERSION = 1
+
+def file_hash(filepath: str) -> str:
+    """Get the sha256 of a file's contents
+
+    Args:
+        filepath (str): The file to hash
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 class FbxAnimation:
     """Represents an animated armature loaded from an fbx file. 
     Provides functionality for easily looping and playing the animation.
     """
     
-    def __init__(self, filepath: str):
-        self._load_fbx(filepath)
+    # Datablock collections an fbx import adds to, removed again when only the keyframes are kept
+    IMPORTED_DATA = ("objects", "meshes", "armatures", "materials", "images", "textures", "actions")
+    
+    def __init__(self, filepath: str, bake_dir: str | None = BAKE_DIR, shared: "FbxAnimation | None" = None):
+        """
+        Args:
+            filepath (str): The fbx file to load
+            bake_dir (str | None, optional): Where baked animations are stored, None to disable baking. Defaults to BAKE_DIR.
+            shared (FbxAnimation | None, optional): An animation of the same character, whose armature plays this
+                animation instead of importing the character again. Defaults to None.
+        """
+        self._load_fbx(filepath, bake_dir, shared)
         
     def loop_anim(self, start_frame: int, end_frame: int):
         """Loop the animation between two frames
 
+        Every cycle is computed at once and each fcurve is written in one bulk update
+
         Args:
             start_frame (int): The starting frame
             end_frame (int): The ending frame
         """
-        for frame in range(start_frame, end_frame, self.length):
-            self.play_anim(frame, end_frame)
-        self.show_start(end_frame)
+        cycle_starts = np.arange(start_frame, end_frame, self.length)
+        for curve, data in self._curves():
+            frames = (data[:, 0][None, :] + cycle_starts[:, None]).ravel()
+            values = np.tile(data[:, 1], len(cycle_starts))
+            
+            # Skip any frames past [end_frame], then show the start of the animation at [end_frame]
+            keep = frames <= end_frame
+            frames = np.append(frames[keep], data[0, 0] + end_frame)
+            values = np.append(values[keep], data[0, 1])
+            self._write_keyframes(curve, frames, values)
+        self._add_segment(start_frame, end_frame)
             
     def show_start(self, frame: int):
         """Show the first frame of the animation at [frame]
@@ -28,13 +70,9 @@ class FbxAnimation:
         Args:
             frame (int): The frame at which to show the start of the animation
         """
-        for curve in self.action.fcurves:
-            if curve.data_path not in self.anim_data: continue
-            if curve.array_index not in self.anim_data[curve.data_path]: continue
-            data = self.anim_data[curve.data_path][curve.array_index]
-            keyframe = data[0]
-            frame = keyframe[0] + frame
-            curve.keyframe_points.insert(frame, keyframe[1])
+        for curve, data in self._curves():
+            self._write_keyframes(curve, data[:1, 0] + frame, data[:1, 1])
+        self._add_segment(frame, frame)
     
     def play_anim(self, start_frame: int, end_frame: int | float = float('inf')):
         """Play one cycle of the animation beginning at [start_frame] and ending either after one loop or [end_frame]
@@ -43,19 +81,107 @@ class FbxAnimation:
             start_frame (int): The starting frame to play at
             end_frame (int, optional): The frame to stop the animation at. Defaults to float('inf').
         """
-        for curve in self.action.fcurves:
-            # Skip over any curves for which there is no data
-            if curve.data_path not in self.anim_data: continue
-            if curve.array_index not in self.anim_data[curve.data_path]: continue
+        for curve, data in self._curves():
+            # Skip any frames past [end_frame]
+            frames = data[:, 0] + start_frame
+            keep = frames <= end_frame
+            self._write_keyframes(curve, frames[keep], data[keep, 1])
+        self._add_segment(start_frame, min(end_frame, start_frame + self.length))
             
-            # Set the keyframes
-            data = self.anim_data[curve.data_path][curve.array_index]
-            for keyframe in data:
-                frame = keyframe[0] + start_frame
-                
-                # Skip any frames past [end_frame]
-                if frame > end_frame: continue
-                curve.keyframe_points.insert(frame, keyframe[1])
+    def _curves(self):
+        """Get the fcurve of the action for every copied channel together with its keyframes
+        
+        Channels for which there is no data are skipped. Missing fcurves are created, since an armature
+        shared by several animations only starts with the fcurves of the first one. A new curve gets the rest pose
+        keyed on the segments played before it existed, none of which cover it
+        """
+        for data_path, channels in self.anim_data.items():
+            for array_index, data in channels.items():
+                if len(data) == 0: continue
+                curve = self.action.fcurves.find(data_path, index=array_index)
+                if curve is None:
+                    curve = self.action.fcurves.new(data_path, index=array_index)
+                    if data_path.startswith("pose.bones"):
+                        self._key_rest(curve, [frame for start, end, _ in self.segments for frame in (start, end)])
+                yield curve, data
+            
+    def _add_segment(self, start_frame: int | float, end_frame: int | float):
+        """Record that this animation plays between two frames and key the rest pose on the channels it leaves out
+        
+        Every animation of a character shares one action, so a bone channel only some of the animations key would
+        otherwise interpolate or hold across the frames of the others. Each of these channels is keyed to its rest
+        value at both ends of the segment. Segments played before a channel's curve existed are keyed when
+        [_curves] creates it
+
+        Args:
+            start_frame (int | float): The first frame the animation plays
+            end_frame (int | float): The last frame the animation plays
+        """
+        self.segments.append((start_frame, end_frame, self))
+        for curve in self.action.fcurves:
+            if not curve.data_path.startswith("pose.bones"): continue
+            if len(self.anim_data.get(curve.data_path, {}).get(curve.array_index, ())) > 0: continue
+            self._key_rest(curve, [start_frame, end_frame])
+    
+    def _key_rest(self, curve: bpy.types.FCurve, frames: list[int | float]):
+        """Key the rest value of a curve's channel on the given frames
+        
+        Frames that already hold a keyframe are left alone, it is either the key of an animation covering the
+        channel, which must win on a frame two segments share, or already the rest value
+
+        Args:
+            curve (bpy.types.FCurve): The curve to key
+            frames (list[int | float]): The frames to key the rest value on
+        """
+        points = curve.keyframe_points
+        value = self._rest_value(curve.data_path, curve.array_index)
+        for frame in sorted(set(frames)):
+            # Keyframes are sorted by frame, so a binary search finds an existing one without reading them all
+            lo, hi = 0, len(points)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if points[mid].co.x < frame:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < len(points) and points[lo].co.x == frame: continue
+            points.insert(frame, value, options={'FAST'})
+        curve.update()
+    
+    @staticmethod
+    def _rest_value(data_path: str, array_index: int) -> float:
+        if data_path.endswith("rotation_quaternion"):
+            return 1.0 if array_index == 0 else 0.0
+        if data_path.endswith("scale"):
+            return 1.0
+        return 0.0
+    
+    def _write_keyframes(self, curve: bpy.types.FCurve, frames: np.ndarray, values: np.ndarray):
+        """Add keyframes to a curve in one bulk update instead of one insert per keyframe
+        
+        Like keyframe_points.insert, a new keyframe replaces any keyframe already on the same frame
+
+        Args:
+            curve (bpy.types.FCurve): The curve to add the keyframes to
+            frames (np.ndarray): The frames of the keyframes
+            values (np.ndarray): The values of the keyframes
+        """
+        points = curve.keyframe_points
+        existing = np.empty(len(points) * 2, dtype=np.float32)
+        points.foreach_get("co", existing)
+        frames = np.concatenate([existing[0::2], frames]).astype(np.float32)
+        values = np.concatenate([existing[1::2], values]).astype(np.float32)
+        if len(frames) == 0: return
+        
+        # A stable sort keeps later keyframes after earlier ones on the same frame, keep only the last
+        order = np.argsort(frames, kind='stable')
+        frames, values = frames[order], values[order]
+        keep = np.append(frames[1:] != frames[:-1], True)
+        
+        points.clear()
+        points.add(int(keep.sum()))
+        points.foreach_set("co", np.column_stack([frames[keep], values[keep]]).ravel())
+        curve.update()
     
     def _find_child_armature(self, object: bpy.types.Object) -> bpy.types.Object | None:
         """Recursively search through the object heirarchy until an armature object is found
@@ -74,36 +200,119 @@ class FbxAnimation:
                 return child_arm
         return None
         
-    def _load_fbx(self, filepath: str):
+    def _load_fbx(self, filepath: str, bake_dir: str | None = None, shared: "FbxAnimation | None" = None):
         """Load and fbx animation from a file
 
+        The keyframes, length, hip bone and cycle offset are read from the baked archive for the file
+        when there is one, otherwise they are derived from the action and baked for next time.
+        
+        With a [shared] animation only the keyframes are kept: the file is not imported at all when it is
+        baked, otherwise the imported objects are deleted once the keyframes are copied
+
         Args:
             filepath (str): The filpath of the animation to load
+            bake_dir (str | None, optional): Where baked animations are stored, None to disable baking. Defaults to None.
+            shared (FbxAnimation | None, optional): The animation whose armature plays this one. Defaults to None.
         """
+        baked_path = None
+        if bake_dir is not None:
+            baked_path = os.path.join(bake_dir, f"{file_hash(filepath)}-v{BAKE_VERSION}.npz")
+        baked = baked_path is not None and os.path.exists(baked_path)
         
-        # Import the model
-        bpy.ops.import_scene.fbx(filepath=filepath)
-        
-        # Find the root object
-        root = bpy.context.active_object
-        bpy.ops.object.select_all(action='DESELECT')
-        while root.parent:
-            root = root.parent
-        self.root = root
-        
-        # Get information aboyt the animation
-        self.armature = self._find_child_armature(root)
-        self.action = self.armature.animation_data.action
-        self.first_frame = int(min(min(kf.co.x for kf in fc.keyframe_points) for fc in self.action.fcurves))
-        self.last_frame = int(max(max(kf.co.x for kf in fc.keyframe_points) for fc in self.action.fcurves))
+        if shared is None or not baked:
+            # Import the model
+            existing = {name: set(getattr(bpy.data, name)) for name in FbxAnimation.IMPORTED_DATA}
+            bpy.ops.import_scene.fbx(filepath=filepath)
+            imported = [
+                block
+                for name in FbxAnimation.IMPORTED_DATA
+                for block in getattr(bpy.data, name)
+                if block not in existing[name]
+            ]
+            
+            # Find the root object
+            root = bpy.context.active_object
+            bpy.ops.object.select_all(action='DESELECT')
+            while root.parent:
+                root = root.parent
+            self.root = root
+            
+            # Get information aboyt the animation
+            self.armature = self._find_child_armature(root)
+            self.action = self.armature.animation_data.action
+        if baked:
+            self._load_baked(baked_path)
+        else:
+            self.anim_data = self._read_keyframes()
+            self.first_frame = int(min(data[:, 0].min() for data in self._curve_data()))
+            self.last_frame = int(max(data[:, 0].max() for data in self._curve_data()))
+            self.hip_name = self._get_hip_bone_name()
+            self.cycle_offset = self._get_cycle_offset()
+            
+            # Copy the animation data relative to the first frame
+            for data in self._curve_data():
+                data[:, 0] -= self.first_frame
+            if baked_path is not None:
+                self._save_baked(baked_path)
         self.length = self.last_frame - self.first_frame
-        self.hip_name = self._get_hip_bone_name()
-        self.cycle_offset = self._get_cycle_offset()
         self.move_directon = self.cycle_offset.normalized()
         
-        # Copy the animation data and clear the animation
-        self.anim_data = self._copy_anim_data()
+        if shared is not None:
+            # Drop the imported copy with its mesh, armature, materials, images and action, the keyframes go into
+            # the shared armature's action
+            if not baked:
+                bpy.data.batch_remove(imported)
+            self.root = shared.root
+            self.armature = shared.armature
+            self.action = shared.action
+            self.segments = shared.segments
+            return
+        
+        # Clear the animation, the copied data is kept
         self._clear_anim()
+        self.segments = []  # (start frame, end frame, animation) played on the armature, shared with its animations
+        
+    def _curve_data(self) -> list[np.ndarray]:
+        return [data for channels in self.anim_data.values() for data in channels.values()]
+        
+    def _save_baked(self, path: str):
+        """Store the copied animation data, frame range, hip bone and cycle offset in a NumPy archive
+
+        Args:
+            path (str): The archive to write
+        """
+        curves = [(data_path, index, data) for data_path, channels in self.anim_data.items() for index, data in channels.items()]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                data_paths=np.array([c[0] for c in curves], dtype=str),
+                indices=np.array([c[1] for c in curves], dtype=np.int32),
+                counts=np.array([len(c[2]) for c in curves], dtype=np.int64),
+                keyframes=np.concatenate([c[2] for c in curves]) if curves else np.zeros((0, 2)),
+                first_frame=self.first_frame,
+                last_frame=self.last_frame,
+                hip_name=self.hip_name,
+                cycle_offset=np.array(self.cycle_offset[:]),
+            )
+        os.replace(tmp_path, path)
+        
+    def _load_baked(self, path: str):
+        """Load the data stored by [_save_baked]
+
+        Args:
+            path (str): The archive to read
+        """
+        baked = np.load(path)
+        keyframes = np.split(baked["keyframes"], np.cumsum(baked["counts"])[:-1])
+        self.anim_data = {}
+        for data_path, index, data in zip(baked["data_paths"].tolist(), baked["indices"].tolist(), keyframes):
+            self.anim_data.setdefault(data_path, {})[index] = data
+        self.first_frame = int(baked["first_frame"])
+        self.last_frame = int(baked["last_frame"])
+        self.hip_name = str(baked["hip_name"])
+        self.cycle_offset = Vector(baked["cycle_offset"].tolist())
         
     def _clear_anim(self):
         """Clear the animation
@@ -113,27 +322,26 @@ class FbxAnimation:
         for curve in self.action.fcurves:
             curve.keyframe_points.clear()
         
-    def _copy_anim_data(self) -> dict[str, dict[int, list[tuple[int, float]]]]:
+    def _read_keyframes(self) -> dict[str, dict[int, np.ndarray]]:
         """Create a copy of the animation data
         
         The copied data is indexed first by fcurve data path, then channel
-        and contains a list of the keyframe positions for that datapath and channe;
+        and contains a [K x 2] array of the keyframe positions (frame, value) for that datapath and channel
 
         Returns:
-            dict[str, dict[int, list[tuple[int, float]]]]: The copied animation data
+            dict[str, dict[int, np.ndarray]]: The copied animation data
         """
         
         copied_data = {}
         for curve in self.action.fcurves:
-            data_path = curve.data_path
-            array_index = curve.array_index
-            
             # Make sure there is a place to store the data
-            if data_path not in copied_data:
-                copied_data[data_path] = {}
+            if curve.data_path not in copied_data:
+                copied_data[curve.data_path] = {}
                 
             # Copy the keyframe positions into the data path and channel
-            copied_data[data_path][array_index] = [(k.co.x - self.first_frame, k.co.y) for k in curve.keyframe_points]
+            data = np.empty(len(curve.keyframe_points) * 2, dtype=np.float32)
+            curve.keyframe_points.foreach_get("co", data)
+            copied_data[curve.data_path][curve.array_index] = data.reshape(-1, 2)
         return copied_data
         
     def _get_cycle_offset(self) -> Vector:
@@ -1,11 +1,14 @@
 import bpy
 import os, sys
+import argparse
 import addon_utils
 import importlib
 
 # Add the scripts folder to the path
 WORKING_DIR = os.getcwd()
 sys.path.append(f'{WORKING_DIR}/rendering')
+sys.path.append(WORKING_DIR)
+from pipeline import tracing
 
 import static_objects
 import fbx_anim
@@ -22,14 +25,73 @@ importlib.reload(scene_setup)
 
 from renderer import Renderer
 
+def frames_dir_for(output_file):
+    return os.path.splitext(output_file)[0] + "_frames"
+
+def setup(scene_file, environment_path, layered=False, quality=None):
+    """Setup the scene described by a scene file, rendering its environment to [environment_path] when it is layered"""
+    with tracing.span("setup scene", scene=scene_file):
+        options = scene_setup.setup_scene(scene_file, quality)
+    if layered or options["layered"]:
+        with tracing.span("render environment", out=environment_path):
+            Renderer.setup_layers(os.path.join(os.getcwd(), environment_path))
+
+def render_scene(scene_file, output_file, file_format=None, layered=False, quality=None):
+    """Setup the scene described by a scene file and render it to a video
+
+    With a [file_format] (PNG / OPEN_EXR) the frames are rendered to an image sequence first, skipping the frames a
+    previous run already finished, and the video is only encoded once every frame is there. With [layered] (or
+    LAYERED True in the scene file) the static environment is only rendered once. [quality] overrides the
+    scene file's QUALITY tier
+    """
+    setup(scene_file, os.path.splitext(output_file)[0] + "_environment.exr", layered, quality)
+    if file_format is None:
+        with tracing.span("render frames", out=output_file):
+            Renderer.render(os.path.join(os.getcwd(), output_file))
+        return
+    frames_dir = frames_dir_for(output_file)
+    with tracing.span("render frames", out=frames_dir):
+        Renderer.render_frames(os.path.join(os.getcwd(), frames_dir), file_format=file_format)
+    encode_video(frames_dir, output_file)
+
+def render_chunk(scene_file, frames_dir, chunk, chunks, file_format='PNG', layered=False, quality=None):
+    """Setup the scene described by a scene file and render one chunk of its frames to [frames_dir]"""
+    setup(scene_file, os.path.join(frames_dir, f"environment-{chunk}.exr"), layered, quality)
+    with tracing.span("render frames", out=frames_dir, chunk=chunk, chunks=chunks):
+        Renderer.render_frames(os.path.join(os.getcwd(), frames_dir), chunk, chunks, file_format)
+
+def encode_video(frames_dir, output_file):
+    """Encode the frames of every chunk into a video"""
+    with tracing.span("encode video", out=output_file):
+        Renderer.encode_frames(os.path.join(os.getcwd(), frames_dir), os.path.join(os.getcwd(), output_file))
+
 def main():
-    arg_index = sys.argv.index('--') + 1
-    args = sys.argv[arg_index:]
-    scene_file = args[0]
-    output_file = args[1]
+    # scene_file output_file [--frames PNG]                render the whole video, through a resumable image sequence with --frames
+    # scene_file frames_dir --chunk K --chunks N [--frames]  render chunk K of N to an image sequence
+    # frames_dir output_file --encode                      encode the chunks into a video
+    # --layered renders the static environment once and composites the characters over it
+    # --quality draft/preview/final overrides the scene file's QUALITY
+    parser = argparse.ArgumentParser(prog="master_renderer.py")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--chunk", type=int, default=None)
+    parser.add_argument("--chunks", type=int, default=1)
+    parser.add_argument("--encode", action="store_true")
+    parser.add_argument("--frames", type=str, default=None, choices=["PNG", "OPEN_EXR"])
+    parser.add_argument("--layered", action="store_true")
+    parser.add_argument("--quality", type=str, default=None, choices=["draft", "preview", "final"])
+    opt = parser.parse_args(sys.argv[sys.argv.index('--') + 1:])
+    tracing.enable_from_env()
     addon_utils.enable("io_import_images_as_planes")
-    scene_setup.setup_scene(scene_file)
-    Renderer.render(os.path.join(os.getcwd(), output_file))
+    if opt.encode:
+        encode_video(opt.input, opt.output)
+    elif opt.chunk is not None:
+        render_chunk(opt.input, opt.output, opt.chunk, opt.chunks, opt.frames or 'PNG', opt.layered, opt.quality)
+    else:
+        render_scene(opt.input, opt.output, opt.frames, opt.layered, opt.quality)
+    tracing.save()
 
-main()
-bpy.ops.wm.quit_blender()
\ No newline at end of file
+# Only run when started by blender --python, the Blender worker imports render_scene instead
+if __name__ == "__main__":
+    main()
+    bpy.ops.wm.quit_blender()
@@ -1,13 +1,82 @@
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pipeline.tracing import sidecar, span
 
 BLENDER_SCRIPT = 'rendering/master_renderer.py'
 
-def render(scene_file, out_file):
-    subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", scene_file, out_file])
+def render(scene_file, out_file, pool=None, file_format=None):
+    """Render a scene to a video in one Blender process
+
+    With a [file_format] (PNG / OPEN_EXR) the frames go through a resumable image sequence, so running
+    it again after a crash only renders the frames that are missing
+    """
+    if pool is not None:
+        # Reuse a running Blender instead of starting a new one
+        pool.render(scene_file, out_file, file_format)
+        return
+    frames = ["--frames", file_format] if file_format else []
+    with span("blender render", scene=scene_file), sidecar() as env:
+        subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", scene_file, out_file, *frames], env=env)
+
+def render_chunked(scene_file, out_file, chunks=4, retries=2, pool=None, file_format='PNG'):
+    """Render an animation in [chunks] Blender processes at once, then encode the frames into [out_file]
+
+    Each chunk renders its share of the frames to an image sequence next to [out_file]. A chunk that
+    fails is rendered again, up to [retries] times, keeping the frames it already finished
+
+    Args:
+        scene_file (str): The scene to render
+        out_file (str): The video to write
+        chunks (int, optional): How many chunks, and Blender processes, to split the frames over. Defaults to 4.
+        retries (int, optional): How many times to retry a failed chunk. Defaults to 2.
+        pool (BlenderPool | None, optional): Workers to render on, None to start Blender for every chunk. Defaults to None.
+        file_format (str, optional): The image format of the frames [PNG / OPEN_EXR]. Defaults to 'PNG'.
+
+    Raises:
+        Exception: When a chunk still fails after every retry
+    """
+    frames_dir = os.path.splitext(out_file)[0] + "_frames"
+    pending = list(range(chunks))
+    with span("blender render chunks", scene=scene_file, chunks=chunks):
+        for attempt in range(retries + 1):
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                done = list(executor.map(lambda chunk: _render_chunk(scene_file, frames_dir, chunk, chunks, pool, file_format), pending))
+            pending = [chunk for chunk, ok in zip(pending, done) if not ok]
+            if not pending: break
+            print(f"Chunks {pending} of {scene_file} failed (attempt {attempt + 1}/{retries + 1})")
+    if pending:
+        raise Exception(f"Chunks {pending} of {scene_file} failed after {retries + 1} attempts")
+
+    if pool is not None:
+        pool.run("encode", frames_dir=frames_dir, output_file=out_file)
+        return
+    with span("blender encode", out=out_file), sidecar() as env:
+        code = subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", frames_dir, out_file, "--encode"], env=env)
+    if code != 0 or not os.path.exists(out_file):
+        raise Exception(f"Encoding {frames_dir} into {out_file} failed")
+
+def _render_chunk(scene_file, frames_dir, chunk, chunks, pool, file_format):
+    # A chunk is done once Blender has written its info file
+    info_path = os.path.join(frames_dir, f"chunk-{chunk}.json")
+    if os.path.exists(info_path):
+        os.remove(info_path)
+    try:
+        if pool is not None:
+            pool.run("render_chunk", scene_file=scene_file, frames_dir=frames_dir, chunk=chunk, chunks=chunks,
+                     file_format=file_format)
+        else:
+            with span("blender render", scene=scene_file, chunk=chunk), sidecar() as env:
+                subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", scene_file, frames_dir,
+                                 "--chunk", str(chunk), "--chunks", str(chunks), "--frames", file_format], env=env)
+    except Exception as exc:
+        print(f"Chunk {chunk} of {scene_file} failed: {exc}")
+        return False
+    return os.path.exists(info_path)
     
 if __name__ == "__main__":
     SCENE_FILE = 'main.scene'
     OUTPUT_FILE = 'output/out.mp4'
 
     render(SCENE_FILE, OUTPUT_FILE)
-    print("Done")
\ No newline at end of file
+    print("Done")
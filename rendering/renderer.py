@@ -1,5 +1,7 @@
 import bpy
 import os
+import json
+import hashlib
 from math import radians
 from static_objects import StaticObjects
 
@@ -8,16 +10,38 @@ class Renderer:
     EEVEE = 1
     CYCLES = 2
     
+    # Named quality tiers
+    #   resolution: percentage of the output resolution
+    #   cycles_samples / eevee_samples: samples per pixel
+    #   denoise: whether Cycles denoises the result
+    #   time_limit: seconds Cycles may spend per frame before stopping, 0 for no limit
+    #   effects: whether EEVEE uses screen space reflections and bloom
+    QUALITY = {
+        "draft": dict(resolution=25, cycles_samples=16, eevee_samples=8, denoise=True, time_limit=10, effects=False),
+        "preview": dict(resolution=50, cycles_samples=128, eevee_samples=32, denoise=True, time_limit=60, effects=True),
+        "final": dict(resolution=100, cycles_samples=1024, eevee_samples=64, denoise=True, time_limit=0, effects=True),
+    }
+    
     @staticmethod
-    def setup(render_mode=EEVEE):
+    def setup(render_mode=EEVEE, quality="final"):
+        """Clear the scene and setup the render engine
+
+        Args:
+            render_mode (int, optional): The render engine to use [EEVEE / CYCLES]. Defaults to EEVEE.
+            quality (str, optional): The quality tier [draft / preview / final]. Defaults to "final".
+        """
         Renderer.clear_scene()
+        if quality not in Renderer.QUALITY: raise Exception(f"Unknown quality: {quality}")
+        tier = Renderer.QUALITY[quality]
+        bpy.context.scene.render.resolution_percentage = tier["resolution"]
         
         if render_mode == Renderer.EEVEE:
             eevee = bpy.context.scene.eevee
-            eevee.use_ssr = True
-            eevee.use_ssr_refraction = True
+            eevee.taa_render_samples = tier["eevee_samples"]
+            eevee.use_ssr = tier["effects"]
+            eevee.use_ssr_refraction = tier["effects"]
             eevee.ssr_quality = 1
-            eevee.use_bloom = True
+            eevee.use_bloom = tier["effects"]
             eevee.bloom_threshold = 0.8
             eevee.bloom_knee = 0.5
             eevee.bloom_radius = 6.5
@@ -26,12 +50,39 @@ class Renderer:
             bpy.context.scene.render.engine = 'BLENDER_EEVEE'
         elif render_mode == Renderer.CYCLES:
             cycles = bpy.context.scene.cycles
-            cycles.device = 'GPU'
-            cycles.samples = 1024
+            cycles.device = 'GPU' if Renderer.enable_gpu() else 'CPU'
+            cycles.samples = tier["cycles_samples"]
             cycles.adaptive_threshold = 0.1
+            cycles.use_denoising = tier["denoise"]
+            cycles.denoiser = 'OPENIMAGEDENOISE'
+            cycles.time_limit = tier["time_limit"]
             bpy.context.scene.render.engine = 'CYCLES'
+        print(f"Rendering at {quality} quality")
+        
+    @staticmethod
+    def enable_gpu():
+        """Enable every GPU Cycles can use
+        
+        Returns:
+            bool: Whether a GPU was found, Cycles renders on the CPU otherwise
+        """
+        preferences = bpy.context.preferences.addons['cycles'].preferences
+        for device_type in ('OPTIX', 'CUDA', 'HIP', 'METAL', 'ONEAPI'):
+            try:
+                preferences.compute_device_type = device_type
+            except TypeError:
+                # Not supported by this build of Blender
+                continue
+            preferences.get_devices()
+            gpus = [device for device in preferences.devices if device.type == device_type]
+            if gpus:
+                for device in gpus:
+                    device.use = True
+                return True
+        preferences.compute_device_type = 'NONE'
+        print("No GPU found, rendering on the CPU")
+        return False
         
-    
     @staticmethod
     def clear_scene():
         if bpy.context.active_object and bpy.context.active_object.mode == 'EDIT':
@@ -45,6 +96,14 @@ class Renderer:
         bpy.ops.object.select_all(action='SELECT')
         bpy.ops.object.delete()
         
+        # Undo setup_layers
+        scene = bpy.context.scene
+        scene.render.film_transparent = False
+        scene.use_nodes = False
+        for collection in list(bpy.data.collections):
+            if collection.name.startswith("Characters"):
+                bpy.data.collections.remove(collection)
+        
         bpy.ops.outliner.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
         
     @staticmethod
@@ -115,4 +174,267 @@ class Renderer:
         bpy.context.scene.render.filepath = output_path
         bpy.context.scene.render.ffmpeg.format = 'MPEG4'
         bpy.ops.render.render(animation=True)
-        print(f"Saved animation to {output_path}")
\ No newline at end of file
+        print(f"Saved animation to {output_path}")
+        
+    # Objects created by load_basic_scene that never move
+    STATIC_OBJECTS = ("Background", "Ground")
+        
+    @staticmethod
+    def setup_layers(environment_path):
+        """Render the static environment once and only render the characters for every frame
+        
+        The background, ground and skybox are rendered to [environment_path] (linear EXR) with the characters
+        excluded. The characters are then rendered over a transparent film, with the ground as a shadow catcher, and
+        the compositor lays them over the environment. Call it after the scene is setup and before rendering.
+        
+        Falls back to normal rendering when something in the environment moves (water or an animated camera), and
+        with EEVEE, which has no shadow catcher and would drop the characters' ground shadows
+
+        Args:
+            environment_path (str): Where to save the environment render
+
+        Returns:
+            bool: Whether the scene will be rendered in layers
+        """
+        scene = bpy.context.scene
+        if scene.render.engine != 'CYCLES':
+            print("Layered rendering needs the Cycles shadow catcher, rendering every layer for every frame")
+            return False
+        if any(obj.name.startswith("Water") for obj in scene.objects) or (scene.camera and scene.camera.animation_data):
+            print("The environment is animated, rendering every layer for every frame")
+            return False
+        
+        # Move everything that is not part of the environment into its own collection
+        characters = bpy.data.collections.new("Characters")
+        scene.collection.children.link(characters)
+        for obj in list(scene.objects):
+            if obj.name in Renderer.STATIC_OBJECTS or obj.type in ('CAMERA', 'LIGHT'): continue
+            for collection in list(obj.users_collection):
+                collection.objects.unlink(obj)
+            characters.objects.link(obj)
+        layer_collection = bpy.context.view_layer.layer_collection.children[characters.name]
+        
+        # Render the environment once
+        print("Rendering environment")
+        image_settings = scene.render.image_settings
+        file_format, color_depth = image_settings.file_format, image_settings.color_depth
+        layer_collection.exclude = True
+        scene.frame_set(scene.frame_start)
+        scene.render.film_transparent = False
+        scene.use_nodes = False
+        bpy.ops.render.render()
+        image_settings.file_format = 'OPEN_EXR'
+        image_settings.color_depth = '16'
+        os.makedirs(os.path.dirname(environment_path), exist_ok=True)
+        bpy.data.images['Render Result'].save_render(filepath=environment_path)
+        image_settings.file_format, image_settings.color_depth = file_format, color_depth
+        layer_collection.exclude = False
+        
+        # Only the characters and their shadows are rendered from now on
+        scene.render.film_transparent = True
+        for name in Renderer.STATIC_OBJECTS:
+            obj = scene.objects.get(name)
+            if obj is None: continue
+            if name == "Ground":
+                obj.is_shadow_catcher = True
+            else:
+                obj.hide_render = True
+        
+        # Lay the characters over the environment on every frame
+        scene.use_nodes = True
+        scene.render.use_compositing = True
+        tree = scene.node_tree
+        tree.nodes.clear()
+        render_layers = tree.nodes.new('CompositorNodeRLayers')
+        environment = tree.nodes.new('CompositorNodeImage')
+        environment.image = bpy.data.images.load(environment_path, check_existing=False)
+        alpha_over = tree.nodes.new('CompositorNodeAlphaOver')
+        composite = tree.nodes.new('CompositorNodeComposite')
+        tree.links.new(environment.outputs["Image"], alpha_over.inputs[1])
+        tree.links.new(render_layers.outputs["Image"], alpha_over.inputs[2])
+        tree.links.new(alpha_over.outputs["Image"], composite.inputs["Image"])
+        return True
+        
+    # Extension Blender gives each frame for the image formats frames can be rendered to
+    FRAME_EXTENSIONS = {'PNG': ".png", 'OPEN_EXR': ".exr"}
+        
+    @staticmethod
+    def frame_path(frames_dir, frame, extension=".png"):
+        return os.path.join(frames_dir, f"{frame:05d}{extension}")
+        
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+        
+    @staticmethod
+    def load_manifest(frames_dir):
+        """Get the size and hash of every frame finished so far, merged from the manifest of each chunk
+
+        Newer manifests win, so a manifest left behind by a run with another chunk count never overrides the hash
+        of a frame that was rendered again since
+
+        Args:
+            frames_dir (str): The folder containing the frames
+
+        Returns:
+            dict[str, dict]: {"size": int, "sha256": str} keyed by frame file name
+        """
+        manifest = {}
+        if not os.path.isdir(frames_dir): return manifest
+        names = [name for name in os.listdir(frames_dir) if name.startswith("manifest-") and name.endswith(".json")]
+        for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(frames_dir, name))):
+            try:
+                with open(os.path.join(frames_dir, name), 'r') as f:
+                    manifest.update(json.load(f))
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable manifest {name}")
+        return manifest
+        
+    @staticmethod
+    def frame_is_valid(frames_dir, name, manifest):
+        """Check that a frame exists and matches the size and hash recorded when it was written
+        """
+        path = os.path.join(frames_dir, name)
+        entry = manifest.get(name)
+        if entry is None or not os.path.exists(path): return False
+        return os.path.getsize(path) == entry["size"] and Renderer.file_digest(path) == entry["sha256"]
+        
+    @staticmethod
+    def render_frames(frames_dir, chunk=0, chunks=1, file_format='PNG'):
+        """Render one chunk of the animation to a numbered PNG or EXR sequence, resuming where a previous run stopped
+        
+        Chunk [chunk] of [chunks] renders every [chunks]th frame starting at frame_start + [chunk], so the chunks
+        split the animation evenly without knowing its length in advance. The size and hash of every frame is
+        recorded in manifest-[chunk].json as soon as it is written, which only lists the chunk's own frames. Frames
+        that match a manifest are skipped and any other file in their place (e.g. a frame cut off by a crash) is
+        rendered again. Once the chunk is done, the frame range, fps and resolution are written to chunk-[chunk].json
+        for [encode_frames]
+
+        Args:
+            frames_dir (str): The folder to write the frames to
+            chunk (int, optional): Which chunk to render. Defaults to 0.
+            chunks (int, optional): How many chunks the animation is split into. Defaults to 1.
+            file_format (str, optional): The image format of the frames [PNG / OPEN_EXR]. Defaults to 'PNG'.
+        """
+        scene = bpy.context.scene
+        first_frame, last_frame = scene.frame_start, scene.frame_end
+        extension = Renderer.FRAME_EXTENSIONS[file_format]
+        os.makedirs(frames_dir, exist_ok=True)
+        
+        # Only keep the frames this chunk can trust, Blender skips the ones that are left
+        manifest_path = os.path.join(frames_dir, f"manifest-{chunk}.json")
+        # The previous run may have used another chunk count, so its frames are looked up in every manifest
+        previous = Renderer.load_manifest(frames_dir)
+        done = {}
+        for frame in range(first_frame + chunk, last_frame + 1, chunks):
+            name = os.path.basename(Renderer.frame_path(frames_dir, frame, extension))
+            if Renderer.frame_is_valid(frames_dir, name, previous):
+                done[name] = previous[name]
+                continue
+            if os.path.exists(os.path.join(frames_dir, name)):
+                os.remove(os.path.join(frames_dir, name))
+        
+        def save_manifest():
+            with open(manifest_path + ".tmp", 'w') as f:
+                json.dump(done, f)
+            os.replace(manifest_path + ".tmp", manifest_path)
+        
+        def record_frame(scene, *args):
+            path = scene.render.frame_path(frame=scene.frame_current)
+            if not os.path.exists(path): return
+            done[os.path.basename(path)] = {"size": os.path.getsize(path), "sha256": Renderer.file_digest(path)}
+            save_manifest()
+        
+        print(f"Beggining Render of chunk {chunk + 1}/{chunks} to {frames_dir}")
+        save_manifest()
+        scene.render.image_settings.file_format = file_format
+        scene.render.filepath = os.path.join(frames_dir, "#####")
+        scene.render.use_file_extension = True
+        scene.render.use_overwrite = False
+        scene.render.use_placeholder = False
+        scene.frame_start = first_frame + chunk
+        scene.frame_step = chunks
+        bpy.app.handlers.render_write.append(record_frame)
+        try:
+            if scene.frame_start <= last_frame:
+                bpy.ops.render.render(animation=True)
+        finally:
+            bpy.app.handlers.render_write.remove(record_frame)
+            scene.frame_start = first_frame
+            scene.frame_step = 1
+            scene.render.use_overwrite = True
+        
+        info = {
+            "frame_start": first_frame,
+            "frame_end": last_frame,
+            "extension": extension,
+            "fps": scene.render.fps,
+            "fps_base": scene.render.fps_base,
+            "resolution": [scene.render.resolution_x, scene.render.resolution_y, scene.render.resolution_percentage],
+        }
+        info_path = os.path.join(frames_dir, f"chunk-{chunk}.json")
+        with open(info_path + ".tmp", 'w') as f:
+            json.dump(info, f)
+        os.replace(info_path + ".tmp", info_path)
+        print(f"Saved chunk {chunk + 1}/{chunks} to {frames_dir}")
+        
+    @staticmethod
+    def encode_frames(frames_dir, output_path):
+        """Encode the frames rendered by [render_frames] into a video using the sequence editor
+        
+        Nothing is encoded unless every frame is present and matches the manifest. PNG frames are encoded with the
+        Standard view transform since their colors are final, EXR frames keep the scene's view transform
+
+        Args:
+            frames_dir (str): The folder containing the frames and chunk-0.json
+            output_path (str): The video to write
+
+        Raises:
+            Exception: When a frame is missing or does not match the manifest
+        """
+        with open(os.path.join(frames_dir, "chunk-0.json"), 'r') as f:
+            info = json.load(f)
+        extension = info.get("extension", ".png")
+        frames = [Renderer.frame_path(frames_dir, i, extension) for i in range(info["frame_start"], info["frame_end"] + 1)]
+        manifest = Renderer.load_manifest(frames_dir)
+        missing = [path for path in frames if not Renderer.frame_is_valid(frames_dir, os.path.basename(path), manifest)]
+        if missing: raise Exception(f"Missing {len(missing)} frames, e.g. {missing[0]}")
+        
+        Renderer.clear_scene()
+        scene = bpy.context.scene
+        scene.sequence_editor_clear()
+        editor = scene.sequence_editor_create()
+        strip = editor.sequences.new_image(name="Frames", filepath=frames[0], channel=1, frame_start=1)
+        for path in frames[1:]:
+            strip.elements.append(os.path.basename(path))
+        
+        # The worker keeps the scene between jobs and clear_scene does not reset these, so put them back afterwards
+        settings = [(scene, "frame_start"), (scene, "frame_end"), (scene.render, "fps"), (scene.render, "fps_base"),
+                    (scene.render, "resolution_x"), (scene.render, "resolution_y"),
+                    (scene.render, "resolution_percentage"), (scene.render, "use_sequencer"),
+                    (scene.view_settings, "view_transform"), (scene.view_settings, "look"),
+                    (scene.view_settings, "exposure"), (scene.view_settings, "gamma")]
+        saved = [(owner, name, getattr(owner, name)) for owner, name in settings]
+        try:
+            scene.frame_start = 1
+            scene.frame_end = len(frames)
+            scene.render.fps = info["fps"]
+            scene.render.fps_base = info["fps_base"]
+            scene.render.resolution_x, scene.render.resolution_y, scene.render.resolution_percentage = info["resolution"]
+            scene.render.use_sequencer = True
+            if extension != ".exr":
+                # PNG frames already went through the view transform when they were rendered, applying it again
+                # would wash the video out
+                scene.view_settings.view_transform = 'Standard'
+                scene.view_settings.look = 'None'
+                scene.view_settings.exposure = 0
+                scene.view_settings.gamma = 1
+            Renderer.render(output_path)
+        finally:
+            for owner, name, value in saved:
+                setattr(owner, name, value)
+            scene.sequence_editor_clear()
\ No newline at end of file
@@ -2,11 +2,15 @@ import os
 from renderer import Renderer
 from animated_object import AnimatedObject
 
-def setup_scene(filepath):
+def setup_scene(filepath, quality=None):
     """Read a scene file and setup the scene
 
     Args:
         filepath (str): The path to the scene value
+        quality (str | None, optional): The quality tier, overriding the scene file's QUALITY [draft / preview / final]. Defaults to None.
+
+    Returns:
+        dict: How the scene asks to be rendered, {"layered": bool}
     """
     
     print("Setting up scene")
@@ -18,6 +22,8 @@ def setup_scene(filepath):
         use_water = False
         render_mode = Renderer.EEVEE
         character_scale = 1
+        layered = False
+        scene_quality = "final"
         characters = {}
         anim_length = 0
         
@@ -43,10 +49,14 @@ def setup_scene(filepath):
                     character_scale = float(parts[1])
                 case "ANIM_LENGTH":
                     anim_length = int(parts[1])
+                case "LAYERED":
+                    layered = parts[1] == 'True'
+                case "QUALITY":
+                    scene_quality = parts[1]
                 case _:
                     raise Exception(f"Unkown Scene Setup Command: {line}")
             line = scene_file.readline()
-        Renderer.setup(render_mode)
+        Renderer.setup(render_mode, quality or scene_quality)
         Renderer.load_basic_scene(background_image, ground_image, use_water, working_dir=working_directory)
         
         print("Loading Characters")
@@ -112,4 +122,5 @@ def setup_scene(filepath):
                     raise Exception(f"Unkown Animation Command: {line}")
             anim_length = max(anim_length, frame)
             line = scene_file.readline()
-        Renderer.set_animation_length(anim_length)
\ No newline at end of file
+        Renderer.set_animation_length(anim_length)
+    return {"layered": layered}
\ No newline at end of file
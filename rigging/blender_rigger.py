@@ -1,18 +1,59 @@
 import bpy
-import sys
+import numpy as np
+import os, sys
+
+# Blender does not add the working directory to the path
+sys.path.append(os.getcwd())
+from pipeline import tracing
 
 def clear_scene():
     bpy.ops.object.select_all(action='SELECT')
     bpy.ops.object.delete()
     
+def load_npz(filepath, modelname="Mesh"):
+    # Build the mesh straight from the arrays saved by TriMesh.save, skipping text parsing
+    data = np.load(filepath)
+    verts = np.asarray(data["verts"], dtype=np.float32)
+    faces = np.asarray(data["faces"], dtype=np.int32)
+
+    mesh = bpy.data.meshes.new(modelname)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.ravel())
+    mesh.loops.add(faces.size)
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, faces.size, 3, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):
+        mesh.polygons.foreach_set("loop_total", np.full(len(faces), 3, dtype=np.int32))
+    mesh.polygons.foreach_set("vertices", faces.ravel())
+
+    # Same attribute the OBJ importer creates for vertex colors
+    if all(f"v_{c}" in data for c in "RGB"):
+        rgba = np.ones((len(verts), 4), dtype=np.float32)
+        rgba[:, :3] = np.stack([data[f"v_{c}"] for c in "RGB"], axis=1)
+        colors = mesh.color_attributes.new("Color", 'FLOAT_COLOR', 'POINT')
+        colors.data.foreach_set("color", rgba.ravel())
+        mesh.color_attributes.active_color = colors
+
+    mesh.update()
+    mesh.validate()
+    model = bpy.data.objects.new(modelname, mesh)
+    bpy.context.collection.objects.link(model)
+    bpy.ops.object.select_all(action='DESELECT')
+    model.select_set(True)
+    bpy.context.view_layer.objects.active = model
+    return model
+
 def load_model(filepath, modelname="Mesh"):
     # Load the model
-    bpy.ops.wm.obj_import(
-        filepath=filepath,
-        up_axis='Z',
-        forward_axis='Y'
-    )
-    model = bpy.context.active_object
+    if filepath.lower().endswith(".npz"):
+        model = load_npz(filepath, modelname)
+    else:
+        bpy.ops.wm.obj_import(
+            filepath=filepath,
+            up_axis='Z',
+            forward_axis='Y'
+        )
+        model = bpy.context.active_object
     model.name = modelname
     
     # Place the character's feet at z=0
@@ -26,10 +67,28 @@ def load_rig(filepath):
     bpy.ops.import_scene.fbx(filepath = filepath)
     rig = bpy.context.active_object
     rig.show_in_front=True
+    rig.animation_data.action.name = os.path.splitext(os.path.basename(filepath))[0]
     return rig
 
-def get_highest_frame(rig):
-    action = rig.animation_data.action
+def load_action(filepath):
+    # Import an animation that uses the same skeleton and keep only its action
+    existing = set(bpy.data.objects)
+    bpy.ops.import_scene.fbx(filepath = filepath)
+    imported = [obj for obj in bpy.data.objects if obj not in existing]
+    action = None
+    for obj in imported:
+        if obj.type == 'ARMATURE' and obj.animation_data and obj.animation_data.action:
+            action = obj.animation_data.action
+    if action is None:
+        raise Exception(f"No animation found in {filepath}")
+    action.name = os.path.splitext(os.path.basename(filepath))[0]
+    action.use_fake_user = True
+    for obj in imported:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    return action
+
+def get_highest_frame(rig, action=None):
+    action = action or rig.animation_data.action
     return int(max(max(kf.co.x for kf in fc.keyframe_points) for fc in action.fcurves))
 
 def get_head_bone(rig):
@@ -84,7 +143,7 @@ def finalize(model, rig, target_height):
     
     return root
 
-def export_fbx(object, filepath):
+def export_fbx(object, filepath, all_actions=False):
     bpy.ops.object.select_all(action='SELECT')
     object.select_set(True)
     bpy.context.view_layer.objects.active = object
@@ -95,25 +154,69 @@ def export_fbx(object, filepath):
         
         # Speeds up the export
         # May cause issues with mutliple animations in one file
-        bake_anim_use_all_actions=False,
+        bake_anim_use_all_actions=all_actions,
         bake_anim_use_nla_strips=False
     )
 
+def rig_model(model_file, rig_file, out_file, target_height):
+    """Skin a model to a rig and export the result as FBX"""
+    rig_model_animations(model_file, [rig_file], [out_file], target_height)
+
+def rig_model_animations(model_file, rig_files, out_files, target_height):
+    """Skin a model once and export it with every animation in [rig_files]
+
+    The animations must share the first one's skeleton. With one output per animation, each FBX
+    gets one action; with a single output for several animations, one FBX holds all of them.
+    """
+    if len(out_files) not in (1, len(rig_files)):
+        raise Exception("Give one output file, or one per animation")
+    clear_scene()
+    with tracing.span("import mesh", model=model_file):
+        model = load_model(model_file)
+    with tracing.span("import rig", rig=rig_files[0]):
+        rig = load_rig(rig_files[0])
+    scale_model_to_rig(model, rig)
+    with tracing.span("skin weights"):
+        connect_model_rig(model, rig)
+    root = finalize(model, rig, target_height)
+
+    # The weights above are reused for every other animation, only their actions are imported
+    actions = [rig.animation_data.action]
+    for rig_file in rig_files[1:]:
+        with tracing.span("import action", rig=rig_file):
+            actions.append(load_action(rig_file))
+
+    if len(out_files) == 1:
+        bpy.context.scene.frame_end = max(get_highest_frame(rig, action) for action in actions)
+        with tracing.span("export fbx", out=out_files[0], actions=len(actions)):
+            export_fbx(root, out_files[0], all_actions=len(actions) > 1)
+        return
+    for action, out_file in zip(actions, out_files):
+        rig.animation_data.action = action
+        bpy.context.scene.frame_end = get_highest_frame(rig)
+        with tracing.span("export fbx", out=out_file):
+            export_fbx(root, out_file)
+
 def main():
+    # model_file rig_file out_file target_height [rig_file out_file]...
     arg_index = sys.argv.index('--') + 1
     model_file = sys.argv[arg_index]
     rig_file = sys.argv[arg_index + 1]
     out_file = sys.argv[arg_index + 2]
     target_height = float(sys.argv[arg_index + 3])
+    extra = sys.argv[arg_index + 4:]
     
-    clear_scene()
-    model = load_model(model_file)
-    rig = load_rig(rig_file)
-    bpy.context.scene.frame_end = get_highest_frame(rig)
-    scale_model_to_rig(model, rig)
-    connect_model_rig(model, rig)
-    root = finalize(model, rig, target_height)
-    export_fbx(root, out_file)
+    rig_files = [rig_file, *extra[0::2]]
+    out_files = [out_file, *extra[1::2]]
+    if len(set(out_files)) == 1:
+        # Every animation goes to the same file, export them together as separate actions
+        out_files = out_files[:1]
+    
+    tracing.enable_from_env()
+    rig_model_animations(model_file, rig_files, out_files, target_height)
+    tracing.save()
     
-main()
-bpy.ops.wm.quit_blender()
\ No newline at end of file
+# Only run when started by blender --python, the Blender worker imports rig_model instead
+if __name__ == "__main__":
+    main()
+    bpy.ops.wm.quit_blender()
@@ -1,9 +1,30 @@
 import subprocess
+from pipeline.tracing import sidecar, span
 
 BLENDER_SCRIPT = 'rigging/blender_rigger.py'
 
-def rig(model_file, rig_file, out_file, target_height=1.8):
-    subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", model_file, rig_file, out_file, str(target_height)])
+def rig(model_file, rig_file, out_file, target_height=1.8, pool=None):
+    if pool is not None:
+        # Reuse a running Blender instead of starting a new one
+        pool.rig(model_file, rig_file, out_file, target_height)
+        return
+    with span("blender rig", model=model_file, rig=rig_file), sidecar() as env:
+        subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", model_file, rig_file, out_file, str(target_height)], env=env)
+
+def rig_all(model_file, rig_files, out_files, target_height=1.8, pool=None):
+    """Rig one model against several animations sharing a skeleton, solving the skin weights once
+
+    [out_files] has one FBX per animation, or a single FBX that gets every animation as its own action
+    """
+    if pool is not None:
+        pool.rig_all(model_file, rig_files, out_files, target_height)
+        return
+    extra = [path for pair in zip(rig_files[1:], out_files[1:]) for path in pair]
+    if len(out_files) == 1:
+        # Only the first animation has its own output, the rest go into the same file
+        extra = [path for rig_file in rig_files[1:] for path in (rig_file, out_files[0])]
+    with span("blender rig", model=model_file, rigs=len(rig_files)), sidecar() as env:
+        subprocess.call(["blender", "-b", "--python", BLENDER_SCRIPT, "--", model_file, rig_files[0], out_files[0], str(target_height), *extra], env=env)
     
 if __name__ == "__main__":
     MODEL_FOLDER = '../3D_assets/characters'
@@ -133,9 +133,15 @@ def karras_sample_progressive(
     s_tmax=float("inf"),
     s_noise=1.0,
     guidance_scale=0.0,
+    generators=None,
 ):
+    """
+    :param generators: if specified, one th.Generator per sample, used for all
+                       of the noise of that sample. This makes every sample
+                       independent of the others in the batch.
+    """
     sigmas = get_sigmas_karras(steps, sigma_min, sigma_max, rho, device=device)
-    x_T = th.randn(*shape, device=device) * sigma_max
+    x_T = randn(shape, generators, device=device) * sigma_max
     sample_fn = {"heun": sample_heun, "dpm": sample_dpm, "ancestral": sample_euler_ancestral}[
         sampler
     ]
@@ -183,6 +189,7 @@ def karras_sample_progressive(
         x_T,
         sigmas,
         progress=progress,
+        generators=generators,
         **sampler_args,
     ):
         if isinstance(diffusion, GaussianDiffusion):
@@ -191,6 +198,19 @@ def karras_sample_progressive(
             yield obj
 
 
+def randn(shape, generators=None, device=None):
+    if generators is None:
+        return th.randn(*shape, device=device)
+    assert len(generators) == shape[0], "expected one generator per sample"
+    return th.stack([th.randn(*shape[1:], generator=g, device=device) for g in generators])
+
+
+def randn_like(x, generators=None):
+    if generators is None:
+        return th.randn_like(x)
+    return randn(x.shape, generators, device=x.device).to(x.dtype)
+
+
 def get_sigmas_karras(n, sigma_min, sigma_max, rho=7.0, device="cpu"):
     """Constructs the noise schedule of Karras et al. (2022)."""
     ramp = th.linspace(0, 1, n)
@@ -214,7 +234,7 @@ def get_ancestral_step(sigma_from, sigma_to):
 
 
 @th.no_grad()
-def sample_euler_ancestral(model, x, sigmas, progress=False):
+def sample_euler_ancestral(model, x, sigmas, progress=False, generators=None):
     """Ancestral sampling with Euler method steps."""
     s_in = x.new_ones([x.shape[0]])
     indices = range(len(sigmas) - 1)
@@ -231,7 +251,7 @@ def sample_euler_ancestral(model, x, sigmas, progress=False):
         # Euler method
         dt = sigma_down - sigmas[i]
         x = x + d * dt
-        x = x + th.randn_like(x) * sigma_up
+        x = x + randn_like(x, generators) * sigma_up
     yield {"x": x, "pred_xstart": x}
 
 
@@ -245,6 +265,7 @@ def sample_heun(
     s_tmin=0.0,
     s_tmax=float("inf"),
     s_noise=1.0,
+    generators=None,
 ):
     """Implements Algorithm 2 (Heun steps) from Karras et al. (2022)."""
     s_in = x.new_ones([x.shape[0]])
@@ -258,7 +279,7 @@ def sample_heun(
         gamma = (
             min(s_churn / (len(sigmas) - 1), 2**0.5 - 1) if s_tmin <= sigmas[i] <= s_tmax else 0.0
         )
-        eps = th.randn_like(x) * s_noise
+        eps = randn_like(x, generators) * s_noise
         sigma_hat = sigmas[i] * (gamma + 1)
         if gamma > 0:
             x = x + eps * (sigma_hat**2 - sigmas[i] ** 2) ** 0.5
@@ -289,6 +310,7 @@ def sample_dpm(
     s_tmin=0.0,
     s_tmax=float("inf"),
     s_noise=1.0,
+    generators=None,
 ):
     """A sampler inspired by DPM-Solver-2 and Algorithm 2 from Karras et al. (2022)."""
     s_in = x.new_ones([x.shape[0]])
@@ -302,7 +324,7 @@ def sample_dpm(
         gamma = (
             min(s_churn / (len(sigmas) - 1), 2**0.5 - 1) if s_tmin <= sigmas[i] <= s_tmax else 0.0
         )
-        eps = th.randn_like(x) * s_noise
+        eps = randn_like(x, generators) * s_noise
         sigma_hat = sigmas[i] * (gamma + 1)
         if gamma > 0:
             x = x + eps * (sigma_hat**2 - sigmas[i] ** 2) ** 0.5
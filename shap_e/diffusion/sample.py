@@ -1,11 +1,14 @@
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Sequence
 
 import torch
 import torch.nn as nn
 
+from shap_e.util.tracing import span
+
 from .gaussian_diffusion import GaussianDiffusion
 from .k_diffusion import karras_sample
 
+
 DEFAULT_KARRAS_STEPS = 64
 DEFAULT_KARRAS_SIGMA_MIN = 1e-3
 DEFAULT_KARRAS_SIGMA_MAX = 160
@@ -44,7 +47,14 @@ def sample_latents(
     s_churn: float,
     device: Optional[torch.device] = None,
     progress: bool = False,
+    generators: Optional[Sequence[torch.Generator]] = None,
 ) -> torch.Tensor:
+    """
+    :param generators: if specified, one generator on device per sample, which
+                       produces all of the noise of that sample. Only
+                       supported with use_karras.
+    """
+    assert generators is None or use_karras, "generators require Karras sampling"
     sample_shape = (batch_size, model.d_latent)
 
     if device is None:
@@ -57,7 +67,9 @@ def sample_latents(
             model_kwargs[k] = torch.cat([v, torch.zeros_like(v)], dim=0)
 
     sample_shape = (batch_size, model.d_latent)
-    with torch.autocast(device_type=device.type, enabled=use_fp16):
+    with span("shap_e sample_latents", batch_size=batch_size), torch.autocast(
+        device_type=device.type, enabled=use_fp16
+    ):
         if use_karras:
             samples = karras_sample(
                 diffusion=diffusion,
@@ -72,6 +84,7 @@ def sample_latents(
                 s_churn=s_churn,
                 guidance_scale=guidance_scale,
                 progress=progress,
+                generators=generators,
             )
         else:
             internal_batch_size = batch_size
@@ -88,3 +101,72 @@ def sample_latents(
             )
 
     return samples
+
+
+def sample_text_latents(
+    *,
+    texts: Sequence[str],
+    model: nn.Module,
+    diffusion: GaussianDiffusion,
+    guidance_scale: float,
+    clip_denoised: bool,
+    use_fp16: bool,
+    use_karras: bool,
+    karras_steps: int,
+    sigma_min: float,
+    sigma_max: float,
+    s_churn: float,
+    max_batch_size: Optional[int] = None,
+    device: Optional[torch.device] = None,
+    progress: bool = False,
+    seeds: Optional[Sequence[int]] = None,
+) -> Dict[str, torch.Tensor]:
+    """
+    Sample one latent for each distinct prompt, denoising all prompts together
+    in a single diffusion loop (or one loop per max_batch_size prompts).
+
+    :param texts: the prompts to condition on. Duplicates are sampled once.
+    :param max_batch_size: if specified, the largest number of prompts to put
+                           in one diffusion loop, to bound memory usage.
+    :param seeds: if specified, one seed per prompt (the first one counts for
+                  duplicates). All of the noise of a prompt is drawn from its
+                  own seed, so its latent does not depend on the other prompts
+                  in the batch. Only supported with use_karras.
+    :return: a dict mapping each prompt to a [d_latent] latent.
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    chunk_size = max_batch_size or max(len(unique_texts), 1)
+    if device is None:
+        device = next(model.parameters()).device
+    text_seeds = {}
+    if seeds is not None:
+        assert len(seeds) == len(texts), "expected one seed per prompt"
+        for text, seed in zip(texts, seeds):
+            text_seeds.setdefault(text, seed)
+
+    results = {}
+    for i in range(0, len(unique_texts), chunk_size):
+        chunk = unique_texts[i : i + chunk_size]
+        latents = sample_latents(
+            batch_size=len(chunk),
+            model=model,
+            diffusion=diffusion,
+            model_kwargs=dict(texts=chunk),
+            guidance_scale=guidance_scale,
+            clip_denoised=clip_denoised,
+            use_fp16=use_fp16,
+            use_karras=use_karras,
+            karras_steps=karras_steps,
+            sigma_min=sigma_min,
+            sigma_max=sigma_max,
+            s_churn=s_churn,
+            device=device,
+            progress=progress,
+            generators=(
+                [torch.Generator(device=device).manual_seed(text_seeds[t]) for t in chunk]
+                if seeds is not None
+                else None
+            ),
+        )
+        results.update(zip(chunk, latents))
+    return results
@@ -10,7 +10,11 @@ from shap_e.models.nn.utils import to_torch
 from shap_e.models.query import Query
 from shap_e.models.renderer import RayRenderer, render_views_from_rays
 from shap_e.models.stf.base import Model
-from shap_e.models.stf.renderer import STFRendererBase, render_views_from_stf
+from shap_e.models.stf.renderer import (
+    STFRendererBase,
+    extract_meshes_from_stf,
+    render_views_from_stf,
+)
 from shap_e.models.volume import BoundingBoxVolume, Volume
 from shap_e.rendering.blender.constants import BASIC_AMBIENT_COLOR, BASIC_DIFFUSE_COLOR
 from shap_e.util.collections import AttrDict
@@ -218,6 +222,7 @@ class NeRSTFRenderer(RayRenderer, STFRendererBase):
                 params=params,
                 options=options,
                 device=self.device,
+                model=self,
             )
 
         elif rendering_mode == "stf":
@@ -255,6 +260,7 @@ class NeRSTFRenderer(RayRenderer, STFRendererBase):
                 specular_color=self.specular_color,
                 output_srgb=self.output_srgb,
                 device=self.device,
+                model=self,
             )
 
         else:
@@ -266,6 +272,45 @@ class NeRSTFRenderer(RayRenderer, STFRendererBase):
 
         return output
 
+    def extract_mesh(
+        self,
+        params: Optional[Dict] = None,
+        grid_size: Optional[int] = None,
+        options: Optional[AttrDict] = None,
+    ) -> AttrDict:
+        # Meta parameters from bottleneck_to_params() have a leading batch dimension.
+        batch_size = next(iter(params.values())).shape[0] if params else 1
+        params = self.update(params)
+        options = AttrDict() if options is None else AttrDict(options)
+
+        sdf_fn = tf_fn = nerstf_fn = None
+        if self.nerstf is not None:
+            nerstf_fn = partial(
+                self.nerstf.forward_batched, params=subdict(params, "nerstf"), options=options
+            )
+        else:
+            sdf_fn = partial(
+                self.sdf.forward_batched, params=subdict(params, "sdf"), options=options
+            )
+            tf_fn = partial(self.tf.forward_batched, params=subdict(params, "tf"), options=options)
+
+        return extract_meshes_from_stf(
+            options,
+            sdf_fn=sdf_fn,
+            tf_fn=tf_fn,
+            nerstf_fn=nerstf_fn,
+            volume=self.volume,
+            grid_size=grid_size or self.grid_size,
+            batch_size=batch_size,
+            query_batch_size=options.get("query_batch_size"),
+            texture_channels=self.texture_channels,
+            output_srgb=self.output_srgb,
+            refine_levels=options.get("refine_levels", 0),
+            refine_band=options.get("refine_band", 1.5),
+            device=self.device,
+            model=self,
+        )
+
     def get_signed_distance(
         self,
         query: Query,
@@ -11,6 +11,7 @@ from shap_e.models.nn.camera import (
     projective_camera_frame,
 )
 from shap_e.models.nn.meta import MetaModule
+from shap_e.util.autotune import RAY_CANDIDATES, tuned_batch_size
 from shap_e.util.collections import AttrDict
 
 
@@ -34,7 +35,8 @@ class Renderer(MetaModule):
         :param batch: contains
             - height: Optional[int]
             - width: Optional[int]
-            - inner_batch_size or ray_batch_size: Optional[int] defaults to 4096 rays
+            - inner_batch_size or ray_batch_size: Optional[int] defaults to 4096
+                rays, or a tuned size when rendering without gradients
 
             And additionally, to specify poses with a default up direction:
             - poses: [batch_size x *shape x 2 x 3] where poses[:, ..., 0, :] are the camera
@@ -86,6 +88,7 @@ class RayRenderer(Renderer):
             params=params,
             options=options,
             device=self.device,
+            model=self,
         )
         return output
 
@@ -114,7 +117,8 @@ class RayRenderer(Renderer):
             For both of the above two options, these may be specified.
             - height: Optional[int]
             - width: Optional[int]
-            - ray_batch_size or inner_batch_size: Optional[int] defaults to 4096 rays
+            - ray_batch_size or inner_batch_size: Optional[int] defaults to 4096
+                rays, or a tuned size when rendering without gradients
 
         :param params: a dictionary of optional meta parameters.
         :param options: A Dict of other hyperparameters that could be
@@ -175,7 +179,12 @@ def render_views_from_rays(
     params: Optional[Dict] = None,
     options: Optional[Dict] = None,
     device: torch.device = torch.device("cuda"),
+    model: Optional[torch.nn.Module] = None,
 ) -> AttrDict:
+    """
+    :param model: the renderer behind render_rays. When given, the default
+        ray_batch_size is tuned for it, see ray_batch_size_for().
+    """
     camera, batch_size, inner_shape = get_camera_from_batch(batch)
     inner_batch_size = int(np.prod(inner_shape))
 
@@ -203,13 +212,25 @@ def render_views_from_rays(
             .reshape(1, inner_batch_size * camera.height * camera.width, 3)
         )
 
-    ray_batch_size = batch.get("ray_batch_size", batch.get("inner_batch_size", 4096))
-    assert rays.shape[1] % ray_batch_size == 0
-    n_batches = rays.shape[1] // ray_batch_size
+    ray_batch_size = ray_batch_size_for(
+        batch.get("ray_batch_size", batch.get("inner_batch_size")),
+        render_rays,
+        rays,
+        radii,
+        params=params,
+        options=options,
+        model=model,
+        device=device,
+    )
+    # The last chunk is short when ray_batch_size does not divide the number of rays.
+    chunk_sizes = [
+        min(ray_batch_size, rays.shape[1] - start)
+        for start in range(0, rays.shape[1], ray_batch_size)
+    ]
 
     output_list = AttrDict(aux_losses=dict())
 
-    for idx in range(n_batches):
+    for idx in range(len(chunk_sizes)):
         rays_batch = AttrDict(
             rays=rays[:, idx * ray_batch_size : (idx + 1) * ray_batch_size],
             radii=radii[:, idx * ray_batch_size : (idx + 1) * ray_batch_size],
@@ -230,7 +251,8 @@ def render_views_from_rays(
         return val.view(batch_size, *inner_shape, camera.height, camera.width, -1)
 
     def _avg(_key: str, loss_list: List[torch.Tensor]):
-        return sum(loss_list) / n_batches
+        # Weight every chunk by its number of rays.
+        return sum(loss * size for loss, size in zip(loss_list, chunk_sizes)) / rays.shape[1]
 
     output = AttrDict(
         {name: _resize(val_list) for name, val_list in output_list.items() if name != "aux_losses"}
@@ -238,3 +260,41 @@ def render_views_from_rays(
     output.aux_losses = output_list.aux_losses.map(_avg)
 
     return output
+
+
+def ray_batch_size_for(
+    ray_batch_size: Optional[int],
+    render_rays: Callable[[AttrDict, AttrDict, AttrDict], AttrDict],
+    rays: torch.Tensor,
+    radii: torch.Tensor,
+    *,
+    params: Optional[Dict],
+    options: Optional[Dict],
+    model: Optional[torch.nn.Module],
+    device: torch.device,
+) -> int:
+    """
+    Pick how many rays per object to render at once.
+
+    An explicit ray_batch_size always wins. Otherwise, when not computing
+    gradients, the fastest chunk size for the device, model and number of rays
+    is measured once and shared between the objects of the meta-batch.
+    """
+    if ray_batch_size is not None:
+        return ray_batch_size
+    if model is None or torch.is_grad_enabled():
+        # Training sets its own sizes, and its memory use is very different.
+        return 4096
+
+    batch_size, n_rays = rays.shape[:2]
+
+    def probe(total: int):
+        n = max(1, total // batch_size)
+        indices = torch.arange(2 * n, device=device) % n_rays
+        for chunk in (indices[:n], indices[n:]):
+            render_rays(
+                AttrDict(rays=rays[:, chunk], radii=radii[:, chunk]), params=params, options=options
+            )
+
+    tuned = tuned_batch_size(probe, device, model, "rays", n_rays, candidates=RAY_CANDIDATES)
+    return max(1, tuned // batch_size)
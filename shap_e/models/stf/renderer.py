@@ -14,10 +14,12 @@ from shap_e.models.query import Query
 from shap_e.models.renderer import Renderer, get_camera_from_batch
 from shap_e.models.volume import BoundingBoxVolume, Volume
 from shap_e.rendering.blender.constants import BASIC_AMBIENT_COLOR, BASIC_DIFFUSE_COLOR
-from shap_e.rendering.mc import marching_cubes
+from shap_e.rendering.mc import marching_cubes, sparse_marching_cubes
 from shap_e.rendering.torch_mesh import TorchMesh
 from shap_e.rendering.view_data import ProjectiveCamera
+from shap_e.util.autotune import tuned_batch_size
 from shap_e.util.collections import AttrDict
+from shap_e.util.tracing import span
 
 from .base import Model
 
@@ -41,6 +43,21 @@ class STFRendererBase(ABC):
     ) -> torch.Tensor:
         pass
 
+    @abstractmethod
+    def extract_mesh(
+        self,
+        params: Optional[Dict] = None,
+        grid_size: Optional[int] = None,
+        options: Optional[Dict] = None,
+    ) -> AttrDict:
+        """
+        Extract a textured mesh for every element of the meta-batch without
+        rendering any views. See extract_meshes_from_stf().
+
+        :param options: can provide query_batch_size (tuned by default), and
+            refine_levels and refine_band to only query the SDF near the surface.
+        """
+
 
 class STFRenderer(Renderer, STFRendererBase):
     def __init__(
@@ -101,6 +118,35 @@ class STFRenderer(Renderer, STFRendererBase):
             specular_color=self.specular_color,
             output_srgb=self.output_srgb,
             device=self.device,
+            model=self,
+        )
+
+    def extract_mesh(
+        self,
+        params: Optional[Dict] = None,
+        grid_size: Optional[int] = None,
+        options: Optional[Dict] = None,
+    ) -> AttrDict:
+        # Meta parameters from bottleneck_to_params() have a leading batch dimension.
+        batch_size = next(iter(params.values())).shape[0] if params else 1
+        params = self.update(params)
+        options = AttrDict() if not options else AttrDict(options)
+
+        return extract_meshes_from_stf(
+            options,
+            sdf_fn=partial(self.sdf.forward_batched, params=subdict(params, "sdf")),
+            tf_fn=partial(self.tf.forward_batched, params=subdict(params, "tf")),
+            nerstf_fn=None,
+            volume=self.volume,
+            grid_size=grid_size or self.grid_size,
+            batch_size=batch_size,
+            query_batch_size=options.get("query_batch_size"),
+            texture_channels=self.texture_channels,
+            output_srgb=self.output_srgb,
+            refine_levels=options.get("refine_levels", 0),
+            refine_band=options.get("refine_band", 1.5),
+            device=self.device,
+            model=self,
         )
 
     def get_signed_distance(
@@ -144,6 +190,7 @@ def render_views_from_stf(
     specular_color: Union[float, Tuple[float]] = 0.2,
     output_srgb: bool = False,
     device: torch.device = torch.device("cuda"),
+    model: Optional[torch.nn.Module] = None,
 ) -> AttrDict:
     """
     :param batch: contains either ["poses", "camera"], or ["cameras"]. Can
@@ -156,6 +203,8 @@ def render_views_from_stf(
     :param grid_size: SDF sampling resolution
     :param texture_channels: what texture to predict
     :param channel_scale: how each channel is scaled
+    :param model: the renderer behind the fns. When given, the default
+        query_batch_size is tuned for it, see stf_query_batch_size().
     :return: at least
         channels: [batch_size, len(cameras), height, width, 3]
         transmittance: [batch_size, len(cameras), height, width, 1]
@@ -178,72 +227,32 @@ def render_views_from_stf(
         raw_density = options.cache.raw_density
         mesh_mask = options.cache.mesh_mask
     else:
-        query_batch_size = batch.get("query_batch_size", batch.get("ray_batch_size", 4096))
-        query_points = volume_query_points(volume, grid_size)
-        fn = nerstf_fn if sdf_fn is None else sdf_fn
-        sdf_out = fn(
-            query=Query(position=query_points[None].repeat(batch_size, 1, 1)),
-            query_batch_size=query_batch_size,
+        query_batch_size = stf_query_batch_size(
+            batch.get("query_batch_size", batch.get("ray_batch_size")),
+            nerstf_fn if sdf_fn is None else sdf_fn,
+            model=model,
+            volume=volume,
+            grid_size=grid_size,
+            batch_size=batch_size,
             options=options,
+            device=device,
         )
-        raw_signed_distance = sdf_out.signed_distance
-        raw_density = None
-        if "density" in sdf_out:
-            raw_density = sdf_out.density
-        with torch.autocast(device_type, enabled=False):
-            fields = sdf_out.signed_distance.float()
-            raw_signed_distance = sdf_out.signed_distance
-            assert (
-                len(fields.shape) == 3 and fields.shape[-1] == 1
-            ), f"expected [meta_batch x inner_batch] SDF results, but got {fields.shape}"
-            fields = fields.reshape(batch_size, *([grid_size] * 3))
-
-            # Force a negative border around the SDFs to close off all the models.
-            full_grid = torch.zeros(
-                batch_size,
-                grid_size + 2,
-                grid_size + 2,
-                grid_size + 2,
-                device=fields.device,
-                dtype=fields.dtype,
-            )
-            full_grid.fill_(-1.0)
-            full_grid[:, 1:-1, 1:-1, 1:-1] = fields
-            fields = full_grid
-
-            raw_meshes = []
-            mesh_mask = []
-            for field in fields:
-                raw_mesh = marching_cubes(field, volume.bbox_min, volume.bbox_max - volume.bbox_min)
-                if len(raw_mesh.faces) == 0:
-                    # DDP deadlocks when there are unused parameters on some ranks
-                    # and not others, so we make sure the field is a dependency in
-                    # the graph regardless of empty meshes.
-                    vertex_dependency = field.mean()
-                    raw_mesh = TorchMesh(
-                        verts=torch.zeros(3, 3, device=device) + vertex_dependency,
-                        faces=torch.tensor([[0, 1, 2]], dtype=torch.long, device=device),
-                    )
-                    # Make sure we only feed back zero gradients to the field
-                    # by masking out the final renderings of this mesh.
-                    mesh_mask.append(False)
-                else:
-                    mesh_mask.append(True)
-                raw_meshes.append(raw_mesh)
-            mesh_mask = torch.tensor(mesh_mask, device=device)
-
-        max_vertices = max(len(m.verts) for m in raw_meshes)
-
-        fn = nerstf_fn if tf_fn is None else tf_fn
-        tf_out = fn(
-            query=Query(
-                position=torch.stack(
-                    [m.verts[torch.arange(0, max_vertices) % len(m.verts)] for m in raw_meshes],
-                    dim=0,
-                )
-            ),
+        fields, raw_meshes, raw_signed_distance, raw_density, mesh_mask = _query_stf_meshes(
+            options,
+            sdf_fn=sdf_fn,
+            nerstf_fn=nerstf_fn,
+            volume=volume,
+            grid_size=grid_size,
+            batch_size=batch_size,
+            query_batch_size=query_batch_size,
+            device=device,
+        )
+        tf_out = _query_stf_textures(
+            options,
+            raw_meshes,
+            tf_fn=tf_fn,
+            nerstf_fn=nerstf_fn,
             query_batch_size=query_batch_size,
-            options=options,
         )
 
         if "cache" in options:
@@ -253,18 +262,7 @@ def render_views_from_stf(
             options.cache.raw_density = raw_density
             options.cache.mesh_mask = mesh_mask
 
-    if output_srgb:
-        tf_out.channels = _convert_srgb_to_linear(tf_out.channels)
-
-    # Make sure the raw meshes have colors.
-    with torch.autocast(device_type, enabled=False):
-        textures = tf_out.channels.float()
-        assert len(textures.shape) == 3 and textures.shape[-1] == len(
-            texture_channels
-        ), f"expected [meta_batch x inner_batch x texture_channels] field results, but got {textures.shape}"
-        for m, texture in zip(raw_meshes, textures):
-            texture = texture[: len(m.verts)]
-            m.vertex_channels = {name: ch for name, ch in zip(texture_channels, texture.unbind(-1))}
+    _set_vertex_channels(raw_meshes, tf_out, texture_channels, output_srgb, device_type)
 
     args = dict(
         options=options,
@@ -280,14 +278,15 @@ def render_views_from_stf(
         tf_out=tf_out,
     )
 
-    try:
-        out = _render_with_pytorch3d(**args)
-    except ModuleNotFoundError as exc:
-        warnings.warn(f"exception rendering with PyTorch3D: {exc}")
-        warnings.warn(
-            "falling back on native PyTorch renderer, which does not support full gradients"
-        )
-        out = _render_with_raycast(**args)
+    with span("stf rasterize", views=inner_batch_size):
+        try:
+            out = _render_with_pytorch3d(**args)
+        except ModuleNotFoundError as exc:
+            warnings.warn(f"exception rendering with PyTorch3D: {exc}")
+            warnings.warn(
+                "falling back on native PyTorch renderer, which does not support full gradients"
+            )
+            out = _render_with_raycast(**args)
 
     # Apply mask to prevent gradients for empty meshes.
     reshaped_mask = mesh_mask.view([-1] + [1] * (len(out.channels.shape) - 1))
@@ -312,6 +311,393 @@ def render_views_from_stf(
     return out
 
 
+def extract_meshes_from_stf(
+    options: AttrDict[str, Any],
+    *,
+    sdf_fn: Optional[Callable],
+    tf_fn: Optional[Callable],
+    nerstf_fn: Optional[Callable],
+    volume: BoundingBoxVolume,
+    grid_size: int,
+    batch_size: int,
+    query_batch_size: Optional[int] = None,
+    texture_channels: Sequence[str] = ("R", "G", "B"),
+    output_srgb: bool = False,
+    refine_levels: int = 0,
+    refine_band: float = 1.5,
+    device: torch.device = torch.device("cuda"),
+    model: Optional[torch.nn.Module] = None,
+) -> AttrDict:
+    """
+    Extract textured meshes without rendering any views.
+
+    This runs the same SDF grid query, marching cubes and per-vertex texture
+    query as render_views_from_stf(), but never builds cameras, rasterizes or
+    computes losses, so it is the cheap path for exporting meshes.
+
+    :param batch_size: the meta-batch size of the params behind the fns.
+    :param query_batch_size: how many points to query the fns with at once,
+        see stf_query_batch_size() for the default.
+    :param refine_levels: if positive, query the SDF on a grid 2 ** refine_levels
+        times coarser first and only refine it near the surface. See
+        _query_stf_meshes_adaptive().
+    :param refine_band: how close to zero, in block diagonals, the SDF must get
+        at a corner for a coarse block to be refined.
+    :return: an AttrDict with
+        raw_meshes: a list of batch_size TorchMeshes with vertex_channels
+        mesh_mask: [batch_size] False where the SDF had no surface
+        sdf_queries: the number of points the SDF was queried at, per mesh
+        and, when refine_levels is 0,
+        fields: [batch_size x (grid_size + 2) ** 3] padded SDF grids
+        raw_signed_distance: the raw SDF query results
+    """
+    query_batch_size = stf_query_batch_size(
+        query_batch_size,
+        nerstf_fn if sdf_fn is None else sdf_fn,
+        model=model,
+        volume=volume,
+        grid_size=grid_size,
+        batch_size=batch_size,
+        options=options,
+        device=device,
+    )
+
+    out = AttrDict()
+    if refine_levels > 0:
+        raw_meshes, mesh_mask, out.sdf_queries = _query_stf_meshes_adaptive(
+            options,
+            sdf_fn=sdf_fn,
+            nerstf_fn=nerstf_fn,
+            volume=volume,
+            grid_size=grid_size,
+            batch_size=batch_size,
+            query_batch_size=query_batch_size,
+            refine_levels=refine_levels,
+            refine_band=refine_band,
+            device=device,
+        )
+    else:
+        fields, raw_meshes, raw_signed_distance, raw_density, mesh_mask = _query_stf_meshes(
+            options,
+            sdf_fn=sdf_fn,
+            nerstf_fn=nerstf_fn,
+            volume=volume,
+            grid_size=grid_size,
+            batch_size=batch_size,
+            query_batch_size=query_batch_size,
+            device=device,
+        )
+        out.sdf_queries = [grid_size**3] * batch_size
+        out.fields = fields
+        out.raw_signed_distance = raw_signed_distance
+        if raw_density is not None:
+            out.raw_density = raw_density
+    tf_out = _query_stf_textures(
+        options,
+        raw_meshes,
+        tf_fn=tf_fn,
+        nerstf_fn=nerstf_fn,
+        query_batch_size=query_batch_size,
+    )
+    _set_vertex_channels(raw_meshes, tf_out, texture_channels, output_srgb, device.type)
+
+    out.raw_meshes = raw_meshes
+    out.mesh_mask = mesh_mask
+    return out
+
+
+def stf_query_batch_size(
+    query_batch_size: Optional[int],
+    fn: Callable,
+    *,
+    model: Optional[torch.nn.Module],
+    volume: BoundingBoxVolume,
+    grid_size: int,
+    batch_size: int,
+    options: AttrDict[str, Any],
+    device: torch.device,
+) -> int:
+    """
+    Pick how many points per object to query an STF field with at once.
+
+    An explicit query_batch_size always wins. Otherwise, when not computing
+    gradients, the fastest chunk size for the device, model and grid size is
+    measured once and shared between the objects of the meta-batch.
+    """
+    if query_batch_size is not None:
+        return query_batch_size
+    if model is None or torch.is_grad_enabled():
+        # Training sets its own sizes, and its memory use is very different.
+        return 4096
+
+    def probe(total: int):
+        points = max(1, total // batch_size)
+        position = torch.rand(batch_size, 2 * points, 3, device=device)
+        fn(
+            query=Query(position=position * (volume.bbox_max - volume.bbox_min) + volume.bbox_min),
+            query_batch_size=points,
+            options=options,
+        )
+
+    return max(1, tuned_batch_size(probe, device, model, "grid", grid_size) // batch_size)
+
+
+def _query_stf_meshes(
+    options: AttrDict[str, Any],
+    *,
+    sdf_fn: Optional[Callable],
+    nerstf_fn: Optional[Callable],
+    volume: BoundingBoxVolume,
+    grid_size: int,
+    batch_size: int,
+    query_batch_size: int,
+    device: torch.device,
+) -> Tuple[torch.Tensor, List[TorchMesh], torch.Tensor, Optional[torch.Tensor], torch.Tensor]:
+    """
+    Query the SDF on a grid and run marching cubes on every field.
+
+    :return: a tuple (fields, raw_meshes, raw_signed_distance, raw_density, mesh_mask).
+    """
+    query_points = volume_query_points(volume, grid_size)
+    fn = nerstf_fn if sdf_fn is None else sdf_fn
+    with span("stf sdf query", grid_size=grid_size, batch_size=batch_size):
+        sdf_out = fn(
+            query=Query(position=query_points[None].repeat(batch_size, 1, 1)),
+            query_batch_size=query_batch_size,
+            options=options,
+        )
+    raw_signed_distance = sdf_out.signed_distance
+    raw_density = None
+    if "density" in sdf_out:
+        raw_density = sdf_out.density
+    with torch.autocast(device.type, enabled=False):
+        fields = sdf_out.signed_distance.float()
+        assert (
+            len(fields.shape) == 3 and fields.shape[-1] == 1
+        ), f"expected [meta_batch x inner_batch] SDF results, but got {fields.shape}"
+        fields = fields.reshape(batch_size, *([grid_size] * 3))
+
+        # Force a negative border around the SDFs to close off all the models.
+        full_grid = torch.zeros(
+            batch_size,
+            grid_size + 2,
+            grid_size + 2,
+            grid_size + 2,
+            device=fields.device,
+            dtype=fields.dtype,
+        )
+        full_grid.fill_(-1.0)
+        full_grid[:, 1:-1, 1:-1, 1:-1] = fields
+        fields = full_grid
+
+        raw_meshes = []
+        mesh_mask = []
+        for field in fields:
+            with span("marching cubes", grid_size=grid_size):
+                raw_mesh = marching_cubes(field, volume.bbox_min, volume.bbox_max - volume.bbox_min)
+            if len(raw_mesh.faces) == 0:
+                raw_mesh = _placeholder_mesh(field, device)
+                # Make sure we only feed back zero gradients to the field
+                # by masking out the final renderings of this mesh.
+                mesh_mask.append(False)
+            else:
+                mesh_mask.append(True)
+            raw_meshes.append(raw_mesh)
+        mesh_mask = torch.tensor(mesh_mask, device=device)
+
+    return fields, raw_meshes, raw_signed_distance, raw_density, mesh_mask
+
+
+def _query_stf_meshes_adaptive(
+    options: AttrDict[str, Any],
+    *,
+    sdf_fn: Optional[Callable],
+    nerstf_fn: Optional[Callable],
+    volume: BoundingBoxVolume,
+    grid_size: int,
+    batch_size: int,
+    query_batch_size: int,
+    refine_levels: int,
+    refine_band: float,
+    device: torch.device,
+) -> Tuple[List[TorchMesh], torch.Tensor, List[int]]:
+    """
+    Produce the meshes of _query_stf_meshes() while only querying the SDF
+    near the surface.
+
+    The padded grid is first sampled every 2 ** refine_levels points. Every
+    block between these samples whose corners change sign, or come within
+    refine_band block diagonals of zero, is split into eight blocks with
+    half the spacing. At full resolution, the blocks that straddle the
+    surface are exactly the cubes sparse marching cubes needs.
+
+    :return: a tuple (raw_meshes, mesh_mask, sdf_queries).
+    """
+    assert 2**refine_levels < grid_size, "the coarsest grid must sample the volume"
+    fn = nerstf_fn if sdf_fn is None else sdf_fn
+    padded_size = grid_size + 2
+    stride = 2**refine_levels
+    # Block corners can lie past the padded grid, where the field is -1 like
+    # on its border.
+    key_size = padded_size + stride
+    corner_offsets = torch.tensor(
+        [[i & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)], device=device
+    )
+    cell_diagonal = ((volume.bbox_max - volume.bbox_min) / (grid_size - 1)).norm().item()
+
+    def to_keys(coords: torch.Tensor) -> torch.Tensor:
+        return (coords[..., 0] * key_size + coords[..., 1]) * key_size + coords[..., 2]
+
+    def from_keys(keys: torch.Tensor) -> torch.Tensor:
+        return torch.stack(
+            [keys // key_size**2, (keys // key_size) % key_size, keys % key_size], dim=-1
+        )
+
+    def is_interior(coords: torch.Tensor) -> torch.Tensor:
+        return ((coords >= 1) & (coords <= grid_size)).all(-1)
+
+    axis = torch.arange(0, padded_size - 1, stride, device=device)
+    blocks = torch.stack(torch.meshgrid(axis, axis, axis, indexing="ij"), dim=-1).reshape(-1, 3)
+    all_blocks = [blocks] * batch_size
+    known_keys = [torch.zeros(0, device=device, dtype=torch.long)] * batch_size
+    known_values = [torch.zeros(0, device=device)] * batch_size
+
+    while True:
+        corners = [b[:, None] + stride * corner_offsets for b in all_blocks]
+
+        # Query the interior corners that earlier levels did not sample.
+        missing = []
+        for keys, corner_keys in zip(known_keys, map(to_keys, corners)):
+            corner_keys = torch.unique(corner_keys)
+            corner_keys = corner_keys[is_interior(from_keys(corner_keys))]
+            missing.append(corner_keys[~torch.isin(corner_keys, keys)])
+        num_missing = max(len(keys) for keys in missing)
+        if num_missing:
+            # Pad every object to the same number of points, as for textures.
+            positions = []
+            for keys in missing:
+                coords = from_keys(keys) if len(keys) else torch.ones(1, 3, device=device)
+                coords = coords[torch.arange(num_missing, device=device) % len(coords)]
+                positions.append(
+                    ((coords - 1).float() / (grid_size - 1)) * (volume.bbox_max - volume.bbox_min)
+                    + volume.bbox_min
+                )
+            points = sum(len(keys) for keys in missing)
+            with span("stf sdf query", grid_size=grid_size, stride=stride, points=points):
+                sdf_out = fn(
+                    query=Query(position=torch.stack(positions, dim=0)),
+                    query_batch_size=query_batch_size,
+                    options=options,
+                )
+            values = sdf_out.signed_distance.float()[..., 0]
+            for i, keys in enumerate(missing):
+                keys = torch.cat([known_keys[i], keys])
+                order = torch.argsort(keys)
+                known_keys[i] = keys[order]
+                known_values[i] = torch.cat([known_values[i], values[i, : len(missing[i])]])[order]
+
+        corner_values = []
+        for keys, values, block_corners in zip(known_keys, known_values, corners):
+            interior = is_interior(block_corners)
+            block_values = torch.full(interior.shape, -1.0, device=device, dtype=values.dtype)
+            indices = torch.searchsorted(keys, to_keys(block_corners[interior]))
+            block_values[interior] = values[indices]
+            corner_values.append(block_values)
+
+        if stride == 1:
+            break
+        for i, (block_corners, block_values) in enumerate(zip(corners, corner_values)):
+            positive = block_values > 0
+            interior = is_interior(block_corners)
+            crossing = positive.any(-1) & ~positive.all(-1)
+            near = ((block_values.abs() <= refine_band * stride * cell_diagonal) & interior).any(-1)
+            # Blocks wider than the volume may hide samples between their corners.
+            unsampled = ~interior.any(-1)
+            refined = all_blocks[i][crossing | near | unsampled]
+            children = (refined[:, None] + (stride // 2) * corner_offsets).reshape(-1, 3)
+            all_blocks[i] = children[(children <= padded_size - 2).all(-1)]
+        stride //= 2
+
+    raw_meshes = []
+    mesh_mask = []
+    for i, (cubes, cube_values) in enumerate(zip(all_blocks, corner_values)):
+        positive = cube_values > 0
+        crossing = positive.any(-1) & ~positive.all(-1)
+        with span("marching cubes", grid_size=grid_size, cubes=int(crossing.sum())):
+            raw_mesh = sparse_marching_cubes(
+                cubes[crossing],
+                cube_values[crossing],
+                [padded_size] * 3,
+                volume.bbox_min,
+                volume.bbox_max - volume.bbox_min,
+            )
+        if len(raw_mesh.faces) == 0:
+            raw_mesh = _placeholder_mesh(known_values[i], device)
+            mesh_mask.append(False)
+        else:
+            mesh_mask.append(True)
+        raw_meshes.append(raw_mesh)
+    mesh_mask = torch.tensor(mesh_mask, device=device)
+
+    return raw_meshes, mesh_mask, [len(keys) for keys in known_keys]
+
+
+def _placeholder_mesh(field: torch.Tensor, device: torch.device) -> TorchMesh:
+    # DDP deadlocks when there are unused parameters on some ranks
+    # and not others, so we make sure the field is a dependency in
+    # the graph regardless of empty meshes.
+    vertex_dependency = field.mean()
+    return TorchMesh(
+        verts=torch.zeros(3, 3, device=device) + vertex_dependency,
+        faces=torch.tensor([[0, 1, 2]], dtype=torch.long, device=device),
+    )
+
+
+def _query_stf_textures(
+    options: AttrDict[str, Any],
+    raw_meshes: List[TorchMesh],
+    *,
+    tf_fn: Optional[Callable],
+    nerstf_fn: Optional[Callable],
+    query_batch_size: int,
+) -> AttrDict:
+    max_vertices = max(len(m.verts) for m in raw_meshes)
+
+    fn = nerstf_fn if tf_fn is None else tf_fn
+    with span("stf texture query", vertices=max_vertices):
+        return fn(
+            query=Query(
+                position=torch.stack(
+                    [m.verts[torch.arange(0, max_vertices) % len(m.verts)] for m in raw_meshes],
+                    dim=0,
+                )
+            ),
+            query_batch_size=query_batch_size,
+            options=options,
+        )
+
+
+def _set_vertex_channels(
+    raw_meshes: List[TorchMesh],
+    tf_out: AttrDict,
+    texture_channels: Sequence[str],
+    output_srgb: bool,
+    device_type: str,
+):
+    if output_srgb:
+        tf_out.channels = _convert_srgb_to_linear(tf_out.channels)
+
+    # Make sure the raw meshes have colors.
+    with torch.autocast(device_type, enabled=False):
+        textures = tf_out.channels.float()
+        assert len(textures.shape) == 3 and textures.shape[-1] == len(
+            texture_channels
+        ), f"expected [meta_batch x inner_batch x texture_channels] field results, but got {textures.shape}"
+        for m, texture in zip(raw_meshes, textures):
+            texture = texture[: len(m.verts)]
+            m.vertex_channels = {name: ch for name, ch in zip(texture_channels, texture.unbind(-1))}
+
+
 def _render_with_pytorch3d(
     options: AttrDict,
     texture_channels: Sequence[str],
@@ -0,0 +1,100 @@
+import json
+import struct
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from shap_e.util.io import buffered_writer
+
+GLB_MAGIC = 0x46546C67
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+COMPONENT_FLOAT = 5126
+COMPONENT_UINT = 5125
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+MODE_TRIANGLES = 4
+
+
+def write_glb(
+    raw_f: BinaryIO,
+    coords: np.ndarray,
+    rgb: Optional[np.ndarray] = None,
+    faces: Optional[np.ndarray] = None,
+):
+    """
+    Write a binary glTF 2.0 file for a mesh or a point cloud.
+
+    :param coords: an [N x 3] array of floating point coordinates.
+    :param rgb: an [N x 3] array of vertex colors, in the range [0.0, 1.0].
+    :param faces: an [N x 3] array of triangles encoded as integer indices.
+    """
+    coords = np.ascontiguousarray(coords, dtype="<f4")
+    arrays = [(coords, "VEC3", COMPONENT_FLOAT, TARGET_ARRAY_BUFFER)]
+    if rgb is not None:
+        arrays.append(
+            (np.ascontiguousarray(rgb, dtype="<f4"), "VEC3", COMPONENT_FLOAT, TARGET_ARRAY_BUFFER)
+        )
+    if faces is not None:
+        arrays.append(
+            (
+                np.ascontiguousarray(faces, dtype="<u4").reshape(-1),
+                "SCALAR",
+                COMPONENT_UINT,
+                TARGET_ELEMENT_ARRAY_BUFFER,
+            )
+        )
+
+    buffer_views = []
+    accessors = []
+    offset = 0
+    for arr, kind, component, target in arrays:
+        buffer_views.append(
+            dict(buffer=0, byteOffset=offset, byteLength=arr.nbytes, target=target)
+        )
+        accessors.append(
+            dict(
+                bufferView=len(buffer_views) - 1,
+                componentType=component,
+                count=len(arr),
+                type=kind,
+            )
+        )
+        offset += arr.nbytes  # every component is 4 bytes, so views stay aligned
+
+    # glTF requires bounds on the position accessor.
+    accessors[0]["min"] = coords.min(axis=0).tolist() if len(coords) else [0.0] * 3
+    accessors[0]["max"] = coords.max(axis=0).tolist() if len(coords) else [0.0] * 3
+
+    attributes = dict(POSITION=0)
+    if rgb is not None:
+        attributes["COLOR_0"] = 1
+    primitive = dict(attributes=attributes, mode=MODE_TRIANGLES if faces is not None else 0)
+    if faces is not None:
+        primitive["indices"] = len(accessors) - 1
+
+    gltf = dict(
+        asset=dict(version="2.0", generator="shap_e"),
+        scene=0,
+        scenes=[dict(nodes=[0])],
+        nodes=[dict(mesh=0)],
+        meshes=[dict(primitives=[primitive])],
+        buffers=[dict(byteLength=offset)],
+        bufferViews=buffer_views,
+        accessors=accessors,
+    )
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    bin_padding = b"\x00" * (-offset % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + offset + len(bin_padding)
+
+    with buffered_writer(raw_f) as f:
+        f.write(struct.pack("<3I", GLB_MAGIC, GLB_VERSION, total))
+        f.write(struct.pack("<2I", len(json_chunk), CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack("<2I", offset + len(bin_padding), CHUNK_BIN))
+        for arr, _, _, _ in arrays:
+            f.write(arr.tobytes())
+        f.write(bin_padding)
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Tuple
+from typing import Sequence
 
 import torch
 
@@ -16,6 +16,10 @@ def marching_cubes(
     """
     For a signed distance field, produce a mesh using marching cubes.
 
+    Only the cubes that straddle the surface are processed (see
+    sparse_marching_cubes()), so apart from the field itself, memory use
+    scales with the surface area rather than the volume of the grid.
+
     :param field: a 3D tensor of field values, where negative values correspond
                   to the outside of the shape. The dimensions correspond to the
                   x, y, and z directions, respectively.
@@ -26,9 +30,6 @@ def marching_cubes(
     """
     assert len(field.shape) == 3, "input must be a 3D scalar field"
     dev = field.device
-
-    grid_size = field.shape
-    grid_size_tensor = torch.tensor(grid_size).to(size)
     lut = _lookup_table(dev)
 
     # Create bitmasks between 0 and 255 (inclusive) indicating the state
@@ -38,79 +39,75 @@ def marching_cubes(
     bitmasks = bitmasks[:, :-1, :] | (bitmasks[:, 1:, :] << 2)
     bitmasks = bitmasks[:, :, :-1] | (bitmasks[:, :, 1:] << 4)
 
-    # Compute corner coordinates across the entire grid.
-    corner_coords = torch.empty(*grid_size, 3, device=dev, dtype=field.dtype)
-    corner_coords[range(grid_size[0]), :, :, 0] = torch.arange(
-        grid_size[0], device=dev, dtype=field.dtype
-    )[:, None, None]
-    corner_coords[:, range(grid_size[1]), :, 1] = torch.arange(
-        grid_size[1], device=dev, dtype=field.dtype
-    )[:, None]
-    corner_coords[:, :, range(grid_size[2]), 2] = torch.arange(
-        grid_size[2], device=dev, dtype=field.dtype
-    )
+    # Cubes entirely inside or outside the shape produce no triangles.
+    cube_coords = torch.nonzero((bitmasks != 0) & (bitmasks != 255))
+    corners = cube_coords[:, None] + lut.corners
+    corner_values = field[corners[..., 0], corners[..., 1], corners[..., 2]]
 
-    # Compute all vertices across all edges in the grid, even though we will
-    # throw some out later. We have (X-1)*Y*Z + X*(Y-1)*Z + X*Y*(Z-1) vertices.
-    # These are all midpoints, and don't account for interpolation (which is
-    # done later based on the used edge midpoints).
-    edge_midpoints = torch.cat(
-        [
-            ((corner_coords[:-1] + corner_coords[1:]) / 2).reshape(-1, 3),
-            ((corner_coords[:, :-1] + corner_coords[:, 1:]) / 2).reshape(-1, 3),
-            ((corner_coords[:, :, :-1] + corner_coords[:, :, 1:]) / 2).reshape(-1, 3),
-        ],
-        dim=0,
-    )
+    return sparse_marching_cubes(cube_coords, corner_values, field.shape, min_point, size)
 
-    # Create a flat array of [X, Y, Z] indices for each cube.
-    cube_indices = torch.zeros(
-        grid_size[0] - 1, grid_size[1] - 1, grid_size[2] - 1, 3, device=dev, dtype=torch.long
-    )
-    cube_indices[range(grid_size[0] - 1), :, :, 0] = torch.arange(grid_size[0] - 1, device=dev)[
-        :, None, None
-    ]
-    cube_indices[:, range(grid_size[1] - 1), :, 1] = torch.arange(grid_size[1] - 1, device=dev)[
-        :, None
-    ]
-    cube_indices[:, :, range(grid_size[2] - 1), 2] = torch.arange(grid_size[2] - 1, device=dev)
-    flat_cube_indices = cube_indices.reshape(-1, 3)
-
-    # Create a flat array mapping each cube to 12 global edge indices.
-    edge_indices = _create_flat_edge_indices(flat_cube_indices, grid_size)
-
-    # Apply the LUT to figure out the triangles.
-    flat_bitmasks = bitmasks.reshape(
-        -1
-    ).long()  # must cast to long for indexing to believe this not a mask
-    local_tris = lut.cases[flat_bitmasks]
-    local_masks = lut.masks[flat_bitmasks]
-    # Compute the global edge indices for the triangles.
-    global_tris = torch.gather(
-        edge_indices, 1, local_tris.reshape(local_tris.shape[0], -1)
-    ).reshape(local_tris.shape)
-    # Select the used triangles for each cube.
-    selected_tris = global_tris.reshape(-1, 3)[local_masks.reshape(-1)]
-
-    # Now we have a bunch of indices into the full list of possible vertices,
-    # but we want to reduce this list to only the used vertices.
-    used_vertex_indices = torch.unique(selected_tris.view(-1))
-    used_edge_midpoints = edge_midpoints[used_vertex_indices]
-    old_index_to_new_index = torch.zeros(len(edge_midpoints), device=dev, dtype=torch.long)
-    old_index_to_new_index[used_vertex_indices] = torch.arange(
-        len(used_vertex_indices), device=dev, dtype=torch.long
-    )
 
-    # Rewrite the triangles to use the new indices
-    selected_tris = torch.gather(old_index_to_new_index, 0, selected_tris.view(-1)).reshape(
-        selected_tris.shape
-    )
+def sparse_marching_cubes(
+    cube_coords: torch.Tensor,
+    corner_values: torch.Tensor,
+    grid_size: Sequence[int],
+    min_point: torch.Tensor,
+    size: torch.Tensor,
+) -> TorchMesh:
+    """
+    Run marching cubes on a subset of the cubes of a regular grid.
+
+    Vertices on edges shared by several cubes are merged, so the result is the
+    same mesh marching_cubes() produces for a full field holding these values.
+    Cubes not given are treated as empty.
+
+    :param cube_coords: an [N x 3] long tensor of grid indices of the (0, 0, 0)
+                        corner of each cube.
+    :param corner_values: an [N x 8] tensor of field values at the corners of
+                          each cube, where corner i is offset by
+                          (i & 1, (i >> 1) & 1, (i >> 2) & 1).
+    :param grid_size: the number of grid points along each axis.
+    :param min_point: a tensor of shape [3] containing the point corresponding
+                      to grid index (0, 0, 0).
+    :param size: a tensor of shape [3] containing the per-axis distance from the
+                 (0, 0, 0) grid corner and the (-1, -1, -1) grid corner.
+    """
+    dev = corner_values.device
+    grid_size_tensor = torch.tensor(list(grid_size)).to(size)
+    lut = _lookup_table(dev)
 
-    # Compute the actual interpolated coordinates corresponding to edge midpoints.
-    v1 = torch.floor(used_edge_midpoints).to(torch.long)
-    v2 = torch.ceil(used_edge_midpoints).to(torch.long)
-    s1 = field[v1[:, 0], v1[:, 1], v1[:, 2]]
-    s2 = field[v2[:, 0], v2[:, 1], v2[:, 2]]
+    bitmasks = ((corner_values > 0).long() << torch.arange(8, device=dev)).sum(-1)
+
+    # Apply the LUT to figure out the triangles, keeping track of the cube
+    # each one came from.
+    local_masks = lut.masks[bitmasks]
+    local_tris = lut.cases[bitmasks][local_masks]  # [T x 3] local edge indices
+    tri_cubes = torch.arange(len(bitmasks), device=dev)[:, None].expand(local_masks.shape)
+    tri_cubes = tri_cubes[local_masks]
+
+    # Name every edge by its lower corner and axis, so that the copies of an
+    # edge shared between neighboring cubes become a single vertex.
+    vertex_cubes = tri_cubes[:, None].expand(local_tris.shape).reshape(-1)
+    vertex_edges = local_tris.reshape(-1)
+    lower = cube_coords[vertex_cubes] + lut.corners[lut.edges[vertex_edges, 0]]
+    global_edges = (
+        (lower[:, 0] * grid_size[1] + lower[:, 1]) * grid_size[2] + lower[:, 2]
+    ) * 3 + lut.edge_axes[vertex_edges]
+    used_edges, faces = torch.unique(global_edges, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+
+    # Shared edges have the same corner values in every cube, so any one of
+    # the copies can be used to place the vertex.
+    first = torch.zeros(len(used_edges), device=dev, dtype=torch.long)
+    first.scatter_(0, faces.reshape(-1), torch.arange(len(global_edges), device=dev))
+    cubes = vertex_cubes[first]
+    corner_1, corner_2 = lut.edges[vertex_edges[first]].unbind(-1)
+
+    # Compute the actual interpolated coordinates corresponding to the edges.
+    v1 = cube_coords[cubes] + lut.corners[corner_1]
+    v2 = cube_coords[cubes] + lut.corners[corner_2]
+    s1 = corner_values[cubes, corner_1]
+    s2 = corner_values[cubes, corner_2]
     p1 = (v1.float() / (grid_size_tensor - 1)) * size + min_point
     p2 = (v2.float() / (grid_size_tensor - 1)) * size + min_point
     # The signs of s1 and s2 should be different. We want to find
@@ -118,88 +115,7 @@ def marching_cubes(
     t = (s1 / (s1 - s2))[:, None]
     verts = t * p2 + (1 - t) * p1
 
-    return TorchMesh(verts=verts, faces=selected_tris)
-
-
-def _create_flat_edge_indices(
-    flat_cube_indices: torch.Tensor, grid_size: Tuple[int, int, int]
-) -> torch.Tensor:
-    num_xs = (grid_size[0] - 1) * grid_size[1] * grid_size[2]
-    y_offset = num_xs
-    num_ys = grid_size[0] * (grid_size[1] - 1) * grid_size[2]
-    z_offset = num_xs + num_ys
-    return torch.stack(
-        [
-            # Edges spanning x-axis.
-            flat_cube_indices[:, 0] * grid_size[1] * grid_size[2]
-            + flat_cube_indices[:, 1] * grid_size[2]
-            + flat_cube_indices[:, 2],
-            flat_cube_indices[:, 0] * grid_size[1] * grid_size[2]
-            + (flat_cube_indices[:, 1] + 1) * grid_size[2]
-            + flat_cube_indices[:, 2],
-            flat_cube_indices[:, 0] * grid_size[1] * grid_size[2]
-            + flat_cube_indices[:, 1] * grid_size[2]
-            + flat_cube_indices[:, 2]
-            + 1,
-            flat_cube_indices[:, 0] * grid_size[1] * grid_size[2]
-            + (flat_cube_indices[:, 1] + 1) * grid_size[2]
-            + flat_cube_indices[:, 2]
-            + 1,
-            # Edges spanning y-axis.
-            (
-                y_offset
-                + flat_cube_indices[:, 0] * (grid_size[1] - 1) * grid_size[2]
-                + flat_cube_indices[:, 1] * grid_size[2]
-                + flat_cube_indices[:, 2]
-            ),
-            (
-                y_offset
-                + (flat_cube_indices[:, 0] + 1) * (grid_size[1] - 1) * grid_size[2]
-                + flat_cube_indices[:, 1] * grid_size[2]
-                + flat_cube_indices[:, 2]
-            ),
-            (
-                y_offset
-                + flat_cube_indices[:, 0] * (grid_size[1] - 1) * grid_size[2]
-                + flat_cube_indices[:, 1] * grid_size[2]
-                + flat_cube_indices[:, 2]
-                + 1
-            ),
-            (
-                y_offset
-                + (flat_cube_indices[:, 0] + 1) * (grid_size[1] - 1) * grid_size[2]
-                + flat_cube_indices[:, 1] * grid_size[2]
-                + flat_cube_indices[:, 2]
-                + 1
-            ),
-            # Edges spanning z-axis.
-            (
-                z_offset
-                + flat_cube_indices[:, 0] * grid_size[1] * (grid_size[2] - 1)
-                + flat_cube_indices[:, 1] * (grid_size[2] - 1)
-                + flat_cube_indices[:, 2]
-            ),
-            (
-                z_offset
-                + (flat_cube_indices[:, 0] + 1) * grid_size[1] * (grid_size[2] - 1)
-                + flat_cube_indices[:, 1] * (grid_size[2] - 1)
-                + flat_cube_indices[:, 2]
-            ),
-            (
-                z_offset
-                + flat_cube_indices[:, 0] * grid_size[1] * (grid_size[2] - 1)
-                + (flat_cube_indices[:, 1] + 1) * (grid_size[2] - 1)
-                + flat_cube_indices[:, 2]
-            ),
-            (
-                z_offset
-                + (flat_cube_indices[:, 0] + 1) * grid_size[1] * (grid_size[2] - 1)
-                + (flat_cube_indices[:, 1] + 1) * (grid_size[2] - 1)
-                + flat_cube_indices[:, 2]
-            ),
-        ],
-        dim=-1,
-    )
+    return TorchMesh(verts=verts, faces=faces)
 
 
 @dataclass
@@ -223,6 +139,9 @@ class McLookupTable:
     #     0                           1
     cases: torch.Tensor  # [256 x 5 x 3] long tensor
     masks: torch.Tensor  # [256 x 5] bool tensor
+    corners: torch.Tensor  # [8 x 3] long tensor of corner offsets
+    edges: torch.Tensor  # [12 x 2] long tensor of the corners of each edge
+    edge_axes: torch.Tensor  # [12] long tensor of the axis each edge spans
 
 
 @lru_cache(maxsize=9)  # if there's more than 8 GPUs and a CPU, don't bother caching
@@ -250,4 +169,16 @@ def _lookup_table(device: torch.device) -> McLookupTable:
             for k, (c1, c2) in enumerate(zip(tri[::2], tri[1::2])):
                 cases[i, j, k] = edge_to_index[(c1, c2) if c1 < c2 else (c2, c1)]
             masks[i, j] = True
-    return McLookupTable(cases=cases, masks=masks)
+
+    corners = torch.tensor(
+        [[i & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)], device=device, dtype=torch.long
+    )
+    edges = torch.zeros(12, 2, device=device, dtype=torch.long)
+    edge_axes = torch.zeros(12, device=device, dtype=torch.long)
+    for (c1, c2), index in edge_to_index.items():
+        edges[index, 0] = c1
+        edges[index, 1] = c2
+        edge_axes[index] = (c2 - c1).bit_length() - 1
+    return McLookupTable(
+        cases=cases, masks=masks, corners=corners, edges=edges, edge_axes=edge_axes
+    )
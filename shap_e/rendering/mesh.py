@@ -1,10 +1,19 @@
+import os
 from dataclasses import dataclass, field
-from typing import BinaryIO, Dict, Optional, Union
+from typing import BinaryIO, Dict, Optional, TextIO, Union
 
 import blobfile as bf
 import numpy as np
 
+from .glb_util import write_glb
+from .obj_util import write_obj
 from .ply_util import write_ply
+from .simplify import (
+    cluster_decimate,
+    remove_degenerate_faces,
+    remove_unreferenced_vertices,
+    weld_vertices,
+)
 
 
 @dataclass
@@ -75,33 +84,59 @@ class TriMesh:
     def has_vertex_colors(self) -> bool:
         return self.vertex_channels is not None and all(x in self.vertex_channels for x in "RGB")
 
-    def write_ply(self, raw_f: BinaryIO):
-        write_ply(
-            raw_f,
-            coords=self.verts,
-            rgb=(
-                np.stack([self.vertex_channels[x] for x in "RGB"], axis=1)
-                if self.has_vertex_colors()
-                else None
-            ),
-            faces=self.faces,
+    def simplify(
+        self, max_faces: Optional[int] = None, weld_tolerance: float = 1e-6
+    ) -> "TriMesh":
+        """
+        Weld coincident vertices, drop degenerate and duplicate faces and, if
+        max_faces is given, decimate the mesh to at most that many faces
+        without breaking its topology (see cluster_decimate).
+        Vertex colors and other vertex channels are averaged over merged
+        vertices. Face normals are dropped since they no longer apply.
+        """
+        verts, faces, vertex_channels = weld_vertices(
+            self.verts, self.faces, self.vertex_channels, tolerance=weld_tolerance
+        )
+        faces, face_channels = remove_degenerate_faces(verts, faces, self.face_channels)
+        verts, faces, vertex_channels = remove_unreferenced_vertices(
+            verts, faces, vertex_channels
+        )
+        if max_faces is not None:
+            verts, faces, vertex_channels, face_channels = cluster_decimate(
+                verts, faces, max_faces, vertex_channels, face_channels
+            )
+        return TriMesh(
+            verts=verts,
+            faces=faces,
+            vertex_channels=vertex_channels,
+            face_channels=face_channels,
         )
 
-    def write_obj(self, raw_f: BinaryIO):
-        if self.has_vertex_colors():
-            vertex_colors = np.stack([self.vertex_channels[x] for x in "RGB"], axis=1)
-            vertices = [
-                "{} {} {} {} {} {}".format(*coord, *color)
-                for coord, color in zip(self.verts.tolist(), vertex_colors.tolist())
-            ]
-        else:
-            vertices = ["{} {} {}".format(*coord) for coord in self.verts.tolist()]
+    def vertex_colors(self) -> Optional[np.ndarray]:
+        if not self.has_vertex_colors():
+            return None
+        return np.stack([self.vertex_channels[x] for x in "RGB"], axis=1)
+
+    def write_ply(self, raw_f: BinaryIO):
+        write_ply(raw_f, coords=self.verts, rgb=self.vertex_colors(), faces=self.faces)
 
-        faces = [
-            "f {} {} {}".format(str(tri[0] + 1), str(tri[1] + 1), str(tri[2] + 1))
-            for tri in self.faces.tolist()
-        ]
+    def write_obj(self, raw_f: Union[BinaryIO, TextIO]):
+        write_obj(raw_f, coords=self.verts, rgb=self.vertex_colors(), faces=self.faces)
 
-        combined_data = ["v " + vertex for vertex in vertices] + faces
+    def write_glb(self, raw_f: BinaryIO):
+        write_glb(raw_f, coords=self.verts, rgb=self.vertex_colors(), faces=self.faces)
 
-        raw_f.writelines("\n".join(combined_data))
+    def write(self, path: str):
+        """
+        Write the mesh to a .obj, .ply, .glb or .npz file, picking the format
+        from the extension.
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npz":
+            self.save(path)
+            return
+        writers = {".obj": self.write_obj, ".ply": self.write_ply, ".glb": self.write_glb}
+        if ext not in writers:
+            raise ValueError(f"unknown mesh format: {ext}")
+        with bf.BlobFile(path, "wb") as f:
+            writers[ext](f)
@@ -0,0 +1,118 @@
+import io
+from typing import BinaryIO, Optional, TextIO, Union
+
+import numpy as np
+
+# Byte used for unused columns of the fixed-width fields; stripped before writing.
+_PAD = 0
+
+
+def write_obj(
+    raw_f: Union[BinaryIO, TextIO],
+    coords: np.ndarray,
+    rgb: Optional[np.ndarray] = None,
+    faces: Optional[np.ndarray] = None,
+    chunk_size: int = 65536,
+):
+    """
+    Write an OBJ file for a mesh, formatting rows in vectorized chunks so that
+    peak memory stays bounded by chunk_size rows regardless of the mesh size.
+
+    float32 data is written as the 9 significant digits needed to round-trip
+    it exactly, using NumPy rather than per-number string formatting. Other
+    float dtypes fall back to Python's repr, which is exact but much slower.
+
+    :param raw_f: a text or binary file to write to.
+    :param coords: an [N x 3] array of floating point coordinates.
+    :param rgb: an [N x 3] array of vertex colors, in the range [0.0, 1.0].
+    :param faces: an [N x 3] array of triangles encoded as integer indices.
+    :param chunk_size: the number of rows to format at once.
+    """
+    binary = not isinstance(raw_f, io.TextIOBase)
+
+    def write_rows(prefix: bytes, rows: np.ndarray, format_fields):
+        for i in range(0, len(rows), chunk_size):
+            data = _join_rows(prefix, format_fields(rows[i : i + chunk_size]))
+            raw_f.write(data if binary else data.decode("ascii"))
+
+    vertices = coords if rgb is None else np.concatenate([coords, rgb], axis=1)
+    write_rows(b"v", vertices, _float_fields)
+
+    if faces is not None:
+        write_rows(b"f", faces.astype(np.int64) + 1, _int_fields)
+
+
+def _join_rows(prefix: bytes, fields: np.ndarray) -> bytes:
+    """
+    Lay out [N x C x W] padded field bytes as "prefix field ... field\\n" rows.
+    """
+    n, c, w = fields.shape
+    out = np.full((n, len(prefix) + c * (w + 1) + 1), _PAD, dtype=np.uint8)
+    out[:, : len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    cells = out[:, len(prefix) : -1].reshape(n, c, w + 1)
+    cells[:, :, 0] = ord(" ")
+    cells[:, :, 1:] = fields
+    out[:, -1] = ord("\n")
+    return out[out != _PAD].tobytes()
+
+
+def _int_fields(values: np.ndarray) -> np.ndarray:
+    """
+    Format non-negative integers as [... x W] padded decimal digits.
+    """
+    width = len(str(max(int(values.max()), 0))) if values.size else 1
+    fields = _digits(values, width)
+    # Blank the leading zeros, keeping at least the last digit.
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    fields[(values[..., None] < powers) & (powers > 1)] = _PAD
+    return fields
+
+
+def _digits(values: np.ndarray, width: int) -> np.ndarray:
+    """
+    Split non-negative integers into [... x width] ASCII digits.
+    """
+    digits = np.empty((*values.shape, width), dtype=np.uint8)
+    # Unsigned division is much cheaper than int64, and 10 digits always fit.
+    rest = values.astype(np.uint64 if width > 9 else np.uint32)
+    for i in range(width - 1, -1, -1):
+        quotient = rest // 10
+        digits[..., i] = rest - quotient * 10 + ord("0")
+        rest = quotient
+    return digits
+
+
+def _float_fields(values: np.ndarray) -> np.ndarray:
+    """
+    Format floats as [... x W] padded fields. float32 values are formatted like
+    "%.8e" (e.g. "-1.25000000e-01"), which is enough to round-trip them.
+    """
+    if values.dtype != np.float32 or not np.isfinite(values).all():
+        text = [[repr(x).encode("ascii") for x in row] for row in values.tolist()]
+        width = max((len(x) for row in text for x in row), default=1)
+        padded = b"".join(x.ljust(width, b"\0") for row in text for x in row)
+        return np.frombuffer(padded, dtype=np.uint8).reshape(*values.shape, width)
+
+    x = np.abs(values.astype(np.float64))
+    nonzero = x > 0
+    exponent = np.zeros(x.shape, dtype=np.int64)
+    exponent[nonzero] = np.floor(np.log10(x[nonzero]))
+    mantissa = np.rint(x * 10.0 ** (8 - exponent)).astype(np.int64)
+    # log10 and the scaling can be off by one decade near powers of ten.
+    for fix in (mantissa >= 10**9, nonzero & (mantissa < 10**8)):
+        exponent[fix] += np.where(mantissa[fix] >= 10**9, 1, -1)
+        mantissa[fix] = np.rint(x[fix] * 10.0 ** (8 - exponent[fix]))
+
+    digits = _digits(mantissa, 9)
+    abs_exponent = np.abs(exponent)
+
+    fields = np.full((*values.shape, 15), _PAD, dtype=np.uint8)
+    fields[..., 0] = np.where(np.signbit(values), ord("-"), _PAD)
+    fields[..., 1] = digits[..., 0]
+    fields[..., 2] = ord(".")
+    fields[..., 3:11] = digits[..., 1:]
+    fields[..., 11] = ord("e")
+    fields[..., 12] = np.where(exponent < 0, ord("-"), ord("+"))
+    fields[..., 13] = abs_exponent // 10 + ord("0")
+    fields[..., 14] = abs_exponent % 10 + ord("0")
+    return fields
@@ -1,4 +1,3 @@
-import struct
 from typing import BinaryIO, Optional
 
 import numpy as np
@@ -11,6 +10,7 @@ def write_ply(
     coords: np.ndarray,
     rgb: Optional[np.ndarray] = None,
     faces: Optional[np.ndarray] = None,
+    chunk_size: int = 65536,
 ):
     """
     Write a PLY file for a mesh or a point cloud.
@@ -18,6 +18,7 @@ def write_ply(
     :param coords: an [N x 3] array of floating point coordinates.
     :param rgb: an [N x 3] array of vertex colors, in the range [0.0, 1.0].
     :param faces: an [N x 3] array of triangles encoded as integer indices.
+    :param chunk_size: the number of vertices or faces to pack at once.
     """
     with buffered_writer(raw_f) as f:
         f.write(b"ply\n")
@@ -35,24 +36,23 @@ def write_ply(
             f.write(b"property list uchar int vertex_index\n")
         f.write(b"end_header\n")
 
+        # Rows are packed with NumPy record arrays in chunks, which keeps memory
+        # bounded while avoiding a struct.pack call per vertex and face.
         if rgb is not None:
-            rgb = (rgb * 255.499).round().astype(int)
-            vertices = [
-                (*coord, *rgb)
-                for coord, rgb in zip(
-                    coords.tolist(),
-                    rgb.tolist(),
-                )
-            ]
-            format = struct.Struct("<3f3B")
-            for item in vertices:
-                f.write(format.pack(*item))
+            vertex_dtype = np.dtype([("xyz", "<f4", (3,)), ("rgb", "u1", (3,))])
         else:
-            format = struct.Struct("<3f")
-            for vertex in coords.tolist():
-                f.write(format.pack(*vertex))
+            vertex_dtype = np.dtype([("xyz", "<f4", (3,))])
+        for i in range(0, len(coords), chunk_size):
+            chunk = np.empty(len(coords[i : i + chunk_size]), dtype=vertex_dtype)
+            chunk["xyz"] = coords[i : i + chunk_size]
+            if rgb is not None:
+                chunk["rgb"] = (rgb[i : i + chunk_size] * 255.499).round()
+            f.write(chunk.tobytes())
 
         if faces is not None:
-            format = struct.Struct("<B3I")
-            for tri in faces.tolist():
-                f.write(format.pack(len(tri), *tri))
+            face_dtype = np.dtype([("count", "u1"), ("indices", "<i4", (3,))])
+            for i in range(0, len(faces), chunk_size):
+                chunk = np.empty(len(faces[i : i + chunk_size]), dtype=face_dtype)
+                chunk["count"] = 3
+                chunk["indices"] = faces[i : i + chunk_size]
+                f.write(chunk.tobytes())
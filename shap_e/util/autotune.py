@@ -0,0 +1,155 @@
+"""
+Pick chunk sizes for batched MLP queries by measuring them.
+
+The fastest number of points (or rays) to push through an MLP at once depends
+on the device, the model and the amount of work, so each combination is timed
+once and the winner is kept in a small JSON profile next to the model cache.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import torch
+from filelock import FileLock
+
+from shap_e.models.download import default_cache_dir
+
+CANDIDATES = (1024, 2048, 4096, 8192, 16384, 32768, 65536)
+# Every ray queries the MLP at many samples, so rays are batched in fewer.
+RAY_CANDIDATES = (256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Guards the cached profiles. Measuring holds a per-key lock instead, so that
+# lookups of other keys do not wait for it.
+_lock = threading.Lock()
+_profiles: Dict[str, Dict[str, int]] = {}
+_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def profile_path() -> str:
+    return os.environ.get(
+        "SHAP_E_AUTOTUNE_PROFILE", os.path.join(default_cache_dir(), "autotune.json")
+    )
+
+
+def device_name(device: torch.device) -> str:
+    if device.type == "cuda":
+        return torch.cuda.get_device_name(device)
+    return f"{device.type}-{torch.get_num_threads()}"
+
+
+def model_name(model: torch.nn.Module) -> str:
+    return f"{type(model).__name__}-{sum(x.numel() for x in model.parameters())}"
+
+
+def is_out_of_memory(exc: BaseException) -> bool:
+    """
+    Check if an exception is torch running out of device or host memory.
+    """
+    if isinstance(exc, torch.cuda.OutOfMemoryError):
+        return True
+    message = str(exc)
+    return isinstance(exc, RuntimeError) and (
+        "out of memory" in message or "DefaultCPUAllocator: can't allocate memory" in message
+    )
+
+
+def tuned_batch_size(
+    probe: Callable[[int], Any],
+    device: torch.device,
+    model: torch.nn.Module,
+    kind: str,
+    size: int,
+    candidates: Sequence[int] = CANDIDATES,
+    path: Optional[str] = None,
+) -> int:
+    """
+    Get the fastest chunk size for a query, measuring it on first use.
+
+    :param probe: runs a query of two chunks of the given size. It is called
+        without gradients.
+    :param device: the device the query runs on.
+    :param model: the model being queried.
+    :param kind: what is being queried, e.g. "grid" or "rays".
+    :param size: the amount of work the chunks split up, e.g. the grid size.
+    :param candidates: the chunk sizes to try, in increasing order.
+    :param path: the profile to use, profile_path() by default.
+    :return: the candidate with the highest throughput that fit in memory.
+    """
+    path = path or profile_path()
+    key = f"{device_name(device)}/{model_name(model)}/{kind}-{size}"
+    with _lock:
+        profile = _load_profile(path)
+        if key in profile:
+            return profile[key]
+        key_lock = _key_locks.setdefault((path, key), threading.Lock())
+
+    with key_lock:
+        with _lock:
+            # Another thread may have measured it while we waited.
+            profile = _load_profile(path)
+            if key in profile:
+                return profile[key]
+
+        best, best_rate = candidates[0], 0.0
+        for batch_size in candidates:
+            try:
+                with torch.no_grad():
+                    probe(batch_size)  # warm up kernels and allocations
+                    _synchronize(device)
+                    start = time.perf_counter()
+                    probe(batch_size)
+                    _synchronize(device)
+            except RuntimeError as exc:
+                # Larger chunks will not fit either.
+                if not is_out_of_memory(exc):
+                    raise
+                if device.type == "cuda":
+                    torch.cuda.empty_cache()
+                break
+            rate = 2 * batch_size / (time.perf_counter() - start)
+            if rate > best_rate:
+                best, best_rate = batch_size, rate
+
+        _save_profile(path, key, best)
+        return best
+
+
+def _synchronize(device: torch.device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def _load_profile(path: str) -> Dict[str, int]:
+    if path not in _profiles:
+        _profiles[path] = _read_profile(path)
+    return _profiles[path]
+
+
+def _read_profile(path: str) -> Dict[str, int]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            profile = json.load(f)
+    except ValueError:
+        # A corrupt profile only costs measuring again.
+        return {}
+    return profile if isinstance(profile, dict) else {}
+
+
+def _save_profile(path: str, key: str, batch_size: int):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with FileLock(path + ".lock"):
+        # Another process may have tuned other keys in the meantime.
+        profile = _read_profile(path)
+        profile[key] = batch_size
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    with _lock:
+        # Merge rather than replace, a concurrent save may have finished first.
+        _load_profile(path).update(profile)
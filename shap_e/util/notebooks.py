@@ -1,6 +1,7 @@
 import base64
 import io
-from typing import Union
+import os
+from typing import List, Optional, Union
 
 import ipywidgets as widgets
 import numpy as np
@@ -8,8 +9,9 @@ import torch
 from PIL import Image
 
 from shap_e.models.nn.camera import DifferentiableCameraBatch, DifferentiableProjectiveCamera
-from shap_e.models.transmitter.base import Transmitter, VectorDecoder
+from shap_e.models.transmitter.base import Transmitter, VectorDecoder, VectorEncoder
 from shap_e.rendering.torch_mesh import TorchMesh
+from shap_e.util.autotune import CANDIDATES, is_out_of_memory
 from shap_e.util.collections import AttrDict
 
 
@@ -65,15 +67,98 @@ def decode_latent_images(
 def decode_latent_mesh(
     xm: Union[Transmitter, VectorDecoder],
     latent: torch.Tensor,
+    grid_size: Optional[int] = None,
+    refine_levels: int = 0,
+    refine_band: float = 1.5,
 ) -> TorchMesh:
-    decoded = xm.renderer.render_views(
-        AttrDict(cameras=create_pan_cameras(2, latent.device)),  # lowest resolution possible
-        params=(xm.encoder if isinstance(xm, Transmitter) else xm).bottleneck_to_params(
-            latent[None]
-        ),
-        options=AttrDict(rendering_mode="stf", render_with_direction=False),
-    )
-    return decoded.raw_meshes[0]
+    return decode_latent_meshes(
+        xm,
+        latent[None],
+        grid_size=grid_size,
+        refine_levels=refine_levels,
+        refine_band=refine_band,
+        max_batch_size=1,
+    )[0]
+
+
+@torch.no_grad()
+def decode_latent_meshes(
+    xm: Union[Transmitter, VectorDecoder],
+    latents: torch.Tensor,
+    grid_size: Optional[int] = None,
+    refine_levels: int = 0,
+    refine_band: float = 1.5,
+    max_batch_size: Optional[int] = None,
+) -> List[TorchMesh]:
+    """
+    Decode many latents into meshes, querying the SDF grid and the vertex
+    textures for a whole batch of latents at once.
+
+    :param latents: an [N x d_latent] tensor.
+    :param grid_size: the SDF sampling resolution, the renderer's by default.
+    :param refine_levels: see extract_meshes_from_stf().
+    :param refine_band: see extract_meshes_from_stf().
+    :param max_batch_size: the most latents to decode at once. By default, as
+        many as fit in half of the free memory of the latents' device, halved
+        again whenever a batch runs out of memory.
+    :return: a list of N meshes.
+    """
+    encoder = xm.encoder if isinstance(xm, Transmitter) else xm
+    adaptive = max_batch_size is None
+    if adaptive:
+        max_batch_size = _mesh_batch_size(encoder, latents, grid_size or xm.renderer.grid_size)
+    meshes = []
+    while len(meshes) < len(latents):
+        try:
+            decoded = xm.renderer.extract_mesh(
+                params=encoder.bottleneck_to_params(
+                    latents[len(meshes) : len(meshes) + max_batch_size]
+                ),
+                grid_size=grid_size,
+                options=AttrDict(
+                    rendering_mode="stf",
+                    render_with_direction=False,
+                    refine_levels=refine_levels,
+                    refine_band=refine_band,
+                ),
+            )
+        except RuntimeError as exc:
+            if not adaptive or max_batch_size == 1 or not is_out_of_memory(exc):
+                raise
+            if latents.device.type == "cuda":
+                torch.cuda.empty_cache()
+            max_batch_size //= 2
+            continue
+        meshes.extend(decoded.raw_meshes)
+    return meshes
+
+
+def _mesh_batch_size(
+    encoder: Union[VectorEncoder, VectorDecoder],
+    latents: torch.Tensor,
+    grid_size: int,
+    memory_fraction: float = 0.5,
+) -> int:
+    params = encoder.bottleneck_to_params(latents[:1])
+    param_bytes = sum(x.numel() * x.element_size() for x in params.values())
+    # Query points, SDF outputs and padded fields for the full grid, with room
+    # for the copies torch.cat() makes when joining query batches.
+    grid_bytes = grid_size**3 * 4 * 16
+    # The hidden activations of one query batch, assuming the widest params
+    # are MLP weight matrices. The query batch size is only known once it is
+    # tuned, so this takes the largest candidate, and OOM errors during
+    # decoding are still handled by decode_latent_meshes().
+    width = max((x.shape[-1] for x in params.values() if x.dim() >= 2), default=0)
+    activation_bytes = CANDIDATES[-1] * width * 4 * 2
+    if latents.device.type == "cuda":
+        free_bytes, _ = torch.cuda.mem_get_info(latents.device)
+    else:
+        try:
+            free_bytes = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError):
+            return len(latents)
+    latent_bytes = param_bytes + grid_bytes + activation_bytes
+    return max(1, min(len(latents), int(free_bytes * memory_fraction) // latent_bytes))
 
 
 def gif_widget(images):
@@ -0,0 +1,13 @@
+"""
+Spans for the MARTA pipeline's trace, which do nothing when shap_e is used on its own.
+"""
+
+from contextlib import contextmanager
+
+try:
+    from pipeline.tracing import span
+except ImportError:  # shap_e used outside of the MARTA pipeline
+
+    @contextmanager
+    def span(name, **args):
+        yield args
@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+autotune = pytest.importorskip("shap_e.util.autotune")
+
+CPU = torch.device("cpu")
+
+
+def oom_probe(limit, message="CUDA out of memory. Tried to allocate 2.00 GiB"):
+    tried = []
+
+    def probe(batch_size):
+        tried.append(batch_size)
+        if batch_size > limit:
+            raise RuntimeError(message)
+
+    return probe, tried
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "CUDA out of memory. Tried to allocate 2.00 GiB",
+        "[enforce fail at alloc_cpu.cpp:114] data. DefaultCPUAllocator: can't allocate memory",
+    ],
+)
+def test_stops_at_out_of_memory(tmp_path, message):
+    path = str(tmp_path / "autotune.json")
+    probe, tried = oom_probe(2048, message)
+    model = torch.nn.Linear(2, 2)
+    assert autotune.tuned_batch_size(probe, CPU, model, "grid", 8, path=path) <= 2048
+    assert max(tried) == 4096
+
+    # The result is kept, so the next call does not measure again.
+    tried.clear()
+    autotune.tuned_batch_size(probe, CPU, model, "grid", 8, path=path)
+    assert tried == []
+    assert len(json.load(open(path))) == 1
+
+
+def test_other_errors_propagate(tmp_path):
+    probe, _ = oom_probe(0, "expected a 3D tensor")
+    with pytest.raises(RuntimeError):
+        autotune.tuned_batch_size(
+            probe, CPU, torch.nn.Linear(2, 3), "grid", 8, path=str(tmp_path / "autotune.json")
+        )
+
+
+def test_corrupt_profile_is_empty(tmp_path):
+    path = tmp_path / "autotune.json"
+    path.write_text('{"cpu-1/Linear-6/grid-8": 10')
+    probe, tried = oom_probe(1 << 30)
+    batch_size = autotune.tuned_batch_size(
+        probe, CPU, torch.nn.Linear(2, 4), "grid", 8, path=str(path)
+    )
+    assert batch_size in autotune.CANDIDATES
+    assert tried
+    assert list(json.load(open(path)).values()) == [batch_size]
+
+
+def test_lookups_do_not_wait_for_measuring(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    model = torch.nn.Linear(2, 2)
+    probe, _ = oom_probe(1 << 30)
+    cached = autotune.tuned_batch_size(probe, CPU, model, "grid", 8, path=path)
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_probe(batch_size):
+        started.set()
+        assert release.wait(timeout=10)
+
+    thread = threading.Thread(
+        target=autotune.tuned_batch_size, args=(slow_probe, CPU, model, "grid", 16, (1024,), path)
+    )
+    thread.start()
+    try:
+        assert started.wait(timeout=10)
+        assert autotune.tuned_batch_size(probe, CPU, model, "grid", 8, path=path) == cached
+    finally:
+        release.set()
+        thread.join()
+    assert len(json.load(open(path))) == 2
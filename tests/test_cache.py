@@ -0,0 +1,47 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("filelock")
+
+from generation.cache import AssetCache
+
+
+def write_bytes(size):
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    return write
+
+
+def test_key_ignores_field_order():
+    assert AssetCache.key(prompt="a", seed=0) == AssetCache.key(seed=0, prompt="a")
+    assert AssetCache.key(prompt="a", seed=0) != AssetCache.key(prompt="a", seed=1)
+
+
+def test_put_and_get(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    key = AssetCache.key(prompt="a")
+    assert cache.get(key, "latent.npy") is None
+    path = cache.put(key, "latent.npy", write_bytes(4))
+    assert cache.get(key, "latent.npy") == path
+    assert os.path.getsize(path) == 4
+    assert [name for name in os.listdir(os.path.dirname(path))] == ["latent.npy"]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = AssetCache(str(tmp_path), max_bytes=25)
+    keys = [AssetCache.key(prompt=p) for p in "abc"]
+    for key in keys[:2]:
+        cache.put(key, "mesh.npz", write_bytes(10))
+        time.sleep(0.01)
+    # Using the first entry makes the second one the least recently used.
+    cache.get(keys[0], "mesh.npz")
+    time.sleep(0.01)
+    cache.put(keys[2], "mesh.npz", write_bytes(10))
+    assert cache.get(keys[0], "mesh.npz") is not None
+    assert cache.get(keys[1], "mesh.npz") is None
+    assert cache.get(keys[2], "mesh.npz") is not None
+    assert cache.size() == 20
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from shap_e.rendering._mc_table import MC_TABLE
+from shap_e.rendering.mc import marching_cubes
+
+EDGE_TO_INDEX = {
+    (0, 1): 0,
+    (2, 3): 1,
+    (4, 5): 2,
+    (6, 7): 3,
+    (0, 2): 4,
+    (1, 3): 5,
+    (4, 6): 6,
+    (5, 7): 7,
+    (0, 4): 8,
+    (1, 5): 9,
+    (2, 6): 10,
+    (3, 7): 11,
+}
+
+
+def dense_marching_cubes(field, min_point, size):
+    """
+    The marching cubes algorithm from before it only processed surface cubes,
+    ported to NumPy: every cube of the grid looks up its triangles and points
+    into one array holding the midpoint of every edge of the grid.
+    """
+    cases = np.zeros((256, 5, 3), dtype=np.int64)
+    masks = np.zeros((256, 5), dtype=bool)
+    for i, case in enumerate(MC_TABLE):
+        for j, tri in enumerate(case):
+            for k, (c1, c2) in enumerate(zip(tri[::2], tri[1::2])):
+                cases[i, j, k] = EDGE_TO_INDEX[(c1, c2) if c1 < c2 else (c2, c1)]
+            masks[i, j] = True
+
+    bitmasks = (field > 0).astype(np.uint8)
+    bitmasks = bitmasks[:-1, :, :] | (bitmasks[1:, :, :] << 1)
+    bitmasks = bitmasks[:, :-1, :] | (bitmasks[:, 1:, :] << 2)
+    bitmasks = bitmasks[:, :, :-1] | (bitmasks[:, :, 1:] << 4)
+
+    grid_x, grid_y, grid_z = field.shape
+    corner_coords = np.stack(np.meshgrid(*map(np.arange, field.shape), indexing="ij"), -1)
+    edge_midpoints = np.concatenate(
+        [
+            ((corner_coords[:-1] + corner_coords[1:]) / 2).reshape(-1, 3),
+            ((corner_coords[:, :-1] + corner_coords[:, 1:]) / 2).reshape(-1, 3),
+            ((corner_coords[:, :, :-1] + corner_coords[:, :, 1:]) / 2).reshape(-1, 3),
+        ]
+    )
+
+    x, y, z = np.stack(
+        np.meshgrid(*[np.arange(n - 1) for n in field.shape], indexing="ij"), -1
+    ).reshape(-1, 3).T
+    x_edges = x * grid_y * grid_z + z
+    y_edges = (grid_x - 1) * grid_y * grid_z + x * (grid_y - 1) * grid_z + y * grid_z + z
+    z_edges = (
+        (grid_x - 1) * grid_y * grid_z
+        + grid_x * (grid_y - 1) * grid_z
+        + x * grid_y * (grid_z - 1)
+        + y * (grid_z - 1)
+        + z
+    )
+    edge_indices = np.stack(
+        [
+            x_edges + y * grid_z,
+            x_edges + (y + 1) * grid_z,
+            x_edges + y * grid_z + 1,
+            x_edges + (y + 1) * grid_z + 1,
+            y_edges,
+            y_edges + (grid_y - 1) * grid_z,
+            y_edges + 1,
+            y_edges + (grid_y - 1) * grid_z + 1,
+            z_edges,
+            z_edges + grid_y * (grid_z - 1),
+            z_edges + (grid_z - 1),
+            z_edges + grid_y * (grid_z - 1) + (grid_z - 1),
+        ],
+        axis=-1,
+    )
+
+    flat_bitmasks = bitmasks.reshape(-1).astype(np.int64)
+    local_tris = cases[flat_bitmasks]
+    global_tris = np.take_along_axis(
+        edge_indices, local_tris.reshape(len(local_tris), -1), axis=1
+    ).reshape(local_tris.shape)
+    selected_tris = global_tris.reshape(-1, 3)[masks[flat_bitmasks].reshape(-1)]
+    used, faces = np.unique(selected_tris.reshape(-1), return_inverse=True)
+
+    midpoints = edge_midpoints[used]
+    v1 = np.floor(midpoints).astype(np.int64)
+    v2 = np.ceil(midpoints).astype(np.int64)
+    s1 = field[tuple(v1.T)].astype(np.float64)
+    s2 = field[tuple(v2.T)].astype(np.float64)
+    p1 = v1 / (np.array(field.shape) - 1) * size + min_point
+    p2 = v2 / (np.array(field.shape) - 1) * size + min_point
+    t = (s1 / (s1 - s2))[:, None]
+    return t * p2 + (1 - t) * p1, faces.reshape(-1, 3)
+
+
+def sorted_triangles(verts, faces):
+    """
+    Get the [M x 9] corner positions of every triangle, rotated to start at
+    its smallest corner (which keeps the winding) and sorted.
+    """
+    tris = verts[faces]
+    keys = np.round(tris, 4)
+    start = np.array([min(range(3), key=lambda i: tuple(tri[i])) for tri in keys])
+    order = (start[:, None] + np.arange(3)) % 3
+    tris = np.take_along_axis(tris, order[:, :, None], axis=1).reshape(-1, 9)
+    keys = np.take_along_axis(keys, order[:, :, None], axis=1).reshape(-1, 9)
+    return tris[np.lexsort(keys.T[::-1])]
+
+
+def sphere_field(grid_size):
+    coords = np.linspace(-1, 1, grid_size)
+    x, y, z = np.meshgrid(coords, coords, coords, indexing="ij")
+    return 0.7 - np.sqrt(x**2 + y**2 + z**2)
+
+
+@pytest.mark.parametrize(
+    "field",
+    [
+        sphere_field(32),
+        np.random.default_rng(0).standard_normal((9, 10, 11)),
+    ],
+    ids=["sphere", "random"],
+)
+def test_marching_cubes_matches_dense(field):
+    field = field.astype(np.float32)
+    min_point, size = np.array([-1.0, -1.0, -1.0]), np.array([2.0, 2.0, 2.0])
+    mesh = marching_cubes(
+        torch.from_numpy(field),
+        torch.tensor(min_point, dtype=torch.float32),
+        torch.tensor(size, dtype=torch.float32),
+    )
+    expected_verts, expected_faces = dense_marching_cubes(field, min_point, size)
+
+    assert len(mesh.verts) == len(expected_verts)
+    np.testing.assert_allclose(
+        sorted_triangles(mesh.verts.numpy(), mesh.faces.numpy()),
+        sorted_triangles(expected_verts, expected_faces),
+        atol=1e-5,
+    )
@@ -0,0 +1,39 @@
+import io
+
+import numpy as np
+
+from shap_e.rendering.obj_util import write_obj
+
+
+def read_obj(text):
+    rows = [line.split() for line in text.splitlines()]
+    verts = np.array([[float(x) for x in row[1:]] for row in rows if row[0] == "v"])
+    faces = np.array([[int(x) for x in row[1:]] for row in rows if row[0] == "f"])
+    return verts, faces
+
+
+def test_write_obj_round_trips_float32():
+    rng = np.random.default_rng(0)
+    bits = rng.integers(0, 2**32, size=30000, dtype=np.uint64).astype(np.uint32)
+    values = bits.view(np.float32)
+    values = values[np.isfinite(values)]
+    extremes = [0.0, -0.0, 1.0, 10.0, 0.1, 1e-45, 1e-38, 3.4028235e38, 0.99999994, 1e9]
+    values = np.concatenate([values, np.array(extremes, dtype=np.float32)])
+    values = values[: len(values) // 6 * 6].reshape(-1, 6)
+    faces = rng.integers(0, len(values), size=(100, 3))
+
+    f = io.BytesIO()
+    write_obj(f, values[:, :3], rgb=values[:, 3:], faces=faces, chunk_size=1000)
+    verts, read_faces = read_obj(f.getvalue().decode("ascii"))
+    np.testing.assert_array_equal(verts.astype(np.float32), values)
+    np.testing.assert_array_equal(np.signbit(verts), np.signbit(values))
+    np.testing.assert_array_equal(read_faces, faces + 1)
+
+
+def test_write_obj_text_matches_binary_and_keeps_float64():
+    coords = np.array([[0.1, -2.5, 1e300], [np.pi, 0.0, np.nan]])
+    text, binary = io.StringIO(), io.BytesIO()
+    write_obj(text, coords, faces=np.array([[0, 1, 0]]))
+    write_obj(binary, coords, faces=np.array([[0, 1, 0]]))
+    assert text.getvalue() == binary.getvalue().decode("ascii")
+    assert text.getvalue() == f"v 0.1 -2.5 1e+300\nv {np.pi!r} 0.0 nan\nf 1 2 1\n"
@@ -0,0 +1,37 @@
+import pytest
+
+from pipeline.scheduler import GPU, Scheduler, TaskFailed
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def make_scheduler():
+    scheduler = Scheduler(blender_workers=1, cpu_workers=2)
+    scheduler.add("a model", lambda: 1, resource=GPU)
+    scheduler.add("a render", fail, after=["a model"])
+    scheduler.add("a video", lambda: 2, after=["a render"])
+    scheduler.add("b render", lambda: 3, after=["a model"])
+    return scheduler
+
+
+def test_run_raises_first_failure():
+    with pytest.raises(TaskFailed) as info:
+        make_scheduler().run()
+    assert info.value.task.name == "a render"
+
+
+def test_keep_going_only_skips_dependents():
+    scheduler = make_scheduler()
+    results = scheduler.run(keep_going=True)
+    assert results == {"a model": 1, "b render": 3}
+    assert list(scheduler.failed) == ["a render"]
+    assert scheduler.skipped == {"a video"}
+
+
+def test_duplicate_task():
+    scheduler = Scheduler()
+    scheduler.add("a", lambda: 1)
+    with pytest.raises(Exception, match="Duplicate task"):
+        scheduler.add("a", lambda: 1)
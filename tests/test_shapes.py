@@ -0,0 +1,51 @@
+import zlib
+
+import pytest
+
+torch = pytest.importorskip("torch")
+shapes = pytest.importorskip("generation.shapes")
+
+from shap_e.diffusion.gaussian_diffusion import GaussianDiffusion, get_named_beta_schedule
+
+
+class FakeTextModel(torch.nn.Module):
+    """A text conditional denoiser small enough to sample on the CPU"""
+
+    d_latent = 8
+
+    def __init__(self):
+        super().__init__()
+        self.scale = torch.nn.Parameter(torch.tensor(0.1))
+
+    def cached_model_kwargs(self, batch_size, model_kwargs):
+        embeddings = []
+        for text in model_kwargs["texts"]:
+            generator = torch.Generator().manual_seed(zlib.crc32(text.encode()))
+            embeddings.append(torch.randn(self.d_latent, generator=generator))
+        return dict(embeddings=torch.stack(embeddings))
+
+    def forward(self, x, t, embeddings):
+        eps = self.scale * x + embeddings
+        return torch.cat([eps, torch.zeros_like(eps)], dim=1)
+
+
+def make_shapes(s_churn):
+    text_to_shape = shapes.TextToShape(
+        device=torch.device("cpu"), karras_steps=8, s_churn=s_churn, use_fp16=False
+    )
+    text_to_shape.model = FakeTextModel()
+    text_to_shape.diffusion = GaussianDiffusion(
+        betas=get_named_beta_schedule("linear", 64),
+        model_mean_type="epsilon",
+        model_var_type="learned_range",
+        loss_type="mse",
+    )
+    return text_to_shape
+
+
+@pytest.mark.parametrize("s_churn", [0, 3])
+def test_latent_does_not_depend_on_batch(s_churn):
+    together = make_shapes(s_churn).sample_latents(["a", "b"])
+    alone = make_shapes(s_churn).sample_latents(["b"])
+    assert torch.equal(together["b"], alone["b"])
+    assert not torch.equal(together["a"], together["b"])
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from shap_e.rendering.simplify import (
+    cluster_decimate,
+    remove_degenerate_faces,
+    remove_unreferenced_vertices,
+    weld_vertices,
+)
+
+
+def icosphere(subdivisions):
+    t = (1 + 5**0.5) / 2
+    verts = np.array(
+        [[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t]]
+        + [[0, -1, -t], [0, 1, -t], [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]],
+        dtype=np.float64,
+    )
+    faces = np.array(
+        [[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4]]
+        + [[11, 10, 2], [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8]]
+        + [[3, 8, 9], [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]]
+    )
+    for _ in range(subdivisions):
+        edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        unique_edges, ids = np.unique(edges, axis=0, return_inverse=True)
+        mids = len(verts) + ids.reshape(-1, 3)
+        verts = np.concatenate([verts, verts[unique_edges].mean(axis=1)])
+        (a, b, c), (ab, bc, ca) = faces.T, mids.T
+        faces = np.concatenate(
+            [np.stack(x, axis=1) for x in [(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)]]
+        )
+    return verts / np.linalg.norm(verts, axis=1, keepdims=True), faces
+
+
+def edge_face_counts(faces):
+    directed = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    _, counts = np.unique(np.sort(directed, axis=1), axis=0, return_counts=True)
+    _, directed_counts = np.unique(directed, axis=0, return_counts=True)
+    return counts, directed_counts
+
+
+def test_weld_vertices():
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1e-8, 0, 0], [1, 1, 0]], dtype=np.float64)
+    faces = np.array([[0, 1, 2], [3, 4, 2]])
+    colors = np.array([0.0, 1.0, 1.0, 1.0, 1.0])
+    new_verts, new_faces, channels = weld_vertices(verts, faces, dict(R=colors), tolerance=1e-6)
+    assert len(new_verts) == 4
+    assert new_faces[0, 0] == new_faces[1, 0]
+    assert channels["R"][new_faces[0, 0]] == pytest.approx(0.5)
+
+
+def test_remove_degenerate_faces():
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [2, 0, 0], [5, 5, 5]], dtype=np.float64)
+    faces = np.array([[0, 1, 2], [0, 0, 1], [2, 1, 0], [1, 2, 0], [0, 1, 3]])
+    kept, channels = remove_degenerate_faces(verts, faces, dict(index=np.arange(5)), min_area=1e-9)
+    assert channels["index"].tolist() == [0]
+    verts, kept, _ = remove_unreferenced_vertices(verts, kept)
+    assert len(verts) == 3
+
+
+@pytest.mark.parametrize("flatness,max_faces", [(1.0, 2000), (1.0, 300), (0.3, 2000)])
+def test_cluster_decimate_budget_and_manifold(flatness, max_faces):
+    verts, faces = icosphere(5)
+    verts = verts * [1, 1, flatness]
+    colors = verts[:, 0].copy()
+    new_verts, new_faces, vertex_channels, _ = cluster_decimate(
+        verts, faces, max_faces, vertex_channels=dict(R=colors)
+    )
+    assert 0 < len(new_faces) <= max_faces
+    assert len(vertex_channels["R"]) == len(new_verts)
+    assert np.unique(new_faces).tolist() == list(range(len(new_verts)))
+    counts, directed_counts = edge_face_counts(new_faces)
+    # A closed sphere stays closed, consistently oriented and edge-manifold.
+    assert (counts == 2).all()
+    assert (directed_counts == 1).all()
+
+
+def test_cluster_decimate_keeps_thin_parts_manifold():
+    verts, faces = icosphere(5)
+    verts = verts * [1, 1, 0.02]
+    _, new_faces, _, _ = cluster_decimate(verts, faces, 2000)
+    counts, directed_counts = edge_face_counts(new_faces)
+    assert len(new_faces) < len(faces)
+    assert (counts == 2).all()
+    assert (directed_counts == 1).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+stf_renderer = pytest.importorskip("shap_e.models.stf.renderer")
+
+from shap_e.models.volume import BoundingBoxVolume
+from shap_e.util.collections import AttrDict
+
+
+def wavy_spheres(query, query_batch_size, options):
+    # One shape per object of the meta-batch, the second one is cut off by the bounding box.
+    position = query.position
+    centers = torch.tensor([[0.1, 0.0, 0.0], [0.0, 0.3, 0.0]])[: len(position), None]
+    radii = torch.tensor([0.5, 0.9])[: len(position), None]
+    distance = radii - (position - centers).norm(dim=-1) + 0.05 * torch.sin(9 * position[..., 0])
+    return AttrDict(signed_distance=distance[..., None])
+
+
+def red(query, query_batch_size, options):
+    return AttrDict(channels=query.position[..., :1])
+
+
+def sorted_triangles(mesh):
+    tris = mesh.verts[mesh.faces].numpy().astype(np.float64)
+    keys = np.round(tris, 4)
+    start = np.array([min(range(3), key=lambda i: tuple(tri[i])) for tri in keys])
+    order = (start[:, None] + np.arange(3)) % 3
+    tris = np.take_along_axis(tris, order[:, :, None], axis=1).reshape(-1, 9)
+    keys = np.take_along_axis(keys, order[:, :, None], axis=1).reshape(-1, 9)
+    return tris[np.lexsort(keys.T[::-1])]
+
+
+@pytest.mark.parametrize("grid_size,refine_levels", [(32, 3), (48, 4), (64, 3)])
+def test_adaptive_extraction_matches_dense(grid_size, refine_levels):
+    device = torch.device("cpu")
+    volume = BoundingBoxVolume(bbox_min=[-1.0] * 3, bbox_max=[1.0] * 3, device=device)
+
+    def extract(levels):
+        return stf_renderer.extract_meshes_from_stf(
+            AttrDict(),
+            sdf_fn=wavy_spheres,
+            tf_fn=red,
+            nerstf_fn=None,
+            volume=volume,
+            grid_size=grid_size,
+            batch_size=2,
+            query_batch_size=4096,
+            texture_channels=("R",),
+            refine_levels=levels,
+            device=device,
+        )
+
+    dense, adaptive = extract(0), extract(refine_levels)
+    assert dense.sdf_queries == [grid_size**3] * 2
+    for i in range(2):
+        assert adaptive.sdf_queries[i] < dense.sdf_queries[i]
+        assert len(adaptive.raw_meshes[i].verts) == len(dense.raw_meshes[i].verts)
+        np.testing.assert_allclose(
+            sorted_triangles(adaptive.raw_meshes[i]),
+            sorted_triangles(dense.raw_meshes[i]),
+            atol=1e-6,
+        )